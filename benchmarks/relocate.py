@@ -0,0 +1,339 @@
+"""Benchmark relocating synthetic virtual environments.
+
+The virtual environments are generated without virtualenv, pip, or network
+access so that their size can be chosen freely. Run from the repository root:
+
+    python benchmarks/relocate.py --scripts 500 --pth 100 --eggs 20 --stats
+"""
+
+from __future__ import division
+from __future__ import absolute_import
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from venvctrl import api  # noqa: E402
+from venvctrl.venv.relocate import RelocateStats  # noqa: E402
+
+
+# The activate scripts of every supported shell with the path in place.
+ACTIVATES = {
+    "activate": (
+        "deactivate () {{\n"
+        "    unset VIRTUAL_ENV\n"
+        "}}\n"
+        'if [ "${{OSTYPE:-}}" = "cygwin" ] || [ "${{OSTYPE:-}}" = "msys" ] ; then\n'
+        '    export VIRTUAL_ENV=$(cygpath "{0}")\n'
+        "else\n"
+        '    export VIRTUAL_ENV="{0}"\n'
+        "fi\n"
+        'PATH="$VIRTUAL_ENV/bin:$PATH"\n'
+        "export PATH\n"
+    ),
+    "activate.csh": (
+        'alias deactivate \'unsetenv VIRTUAL_ENV\'\n'
+        "setenv VIRTUAL_ENV '{0}'\n"
+        'set _OLD_VIRTUAL_PATH="$PATH:q"\n'
+        'setenv PATH "$VIRTUAL_ENV:q/bin:$PATH:q"\n'
+    ),
+    "activate.fish": (
+        "function deactivate -d 'Exit virtualenv mode'\n"
+        "    set -e VIRTUAL_ENV\n"
+        "end\n"
+        "set -gx VIRTUAL_ENV '{0}'\n"
+        'set -gx PATH "$VIRTUAL_ENV"/bin $PATH\n'
+    ),
+    "activate.xsh": (
+        "$VIRTUAL_ENV = r\"{0}\"\n"
+        "$PATH.add($VIRTUAL_ENV + \"/bin\", front=True, replace=True)\n"
+    ),
+    "activate.nu": (
+        'let virtual-env = "{0}"\n'
+        'let bin = "bin"\n'
+        'alias deactivate = source "{0}/bin/deactivate.nu"\n'
+    ),
+}
+# A plain shebang and the new style one that pip writes for long paths.
+SHEBANGS = (
+    "#!{0}/bin/python\n",
+    "#!/bin/sh\n'''exec' {0}/bin/python \"$0\" \"$@\"\n' '''\n",
+)
+SCRIPT_BODY = (
+    "# -*- coding: utf-8 -*-\n"
+    "import re\n"
+    "import sys\n"
+    "from pkg{0}.main import main\n"
+    "if __name__ == '__main__':\n"
+    "    sys.argv[0] = re.sub(r'(-script\\.pyw|\\.exe)?$', '', sys.argv[0])\n"
+    "    sys.exit(main())\n"
+)
+
+
+def _write(path, content):
+    """Write a file, creating any missing parent directories."""
+    parent = os.path.dirname(path)
+    if not os.path.isdir(parent):
+
+        os.makedirs(parent)
+
+    with open(path, "w") as file_handle:
+
+        file_handle.write(content)
+
+
+def build_venv(path, scripts=100, pth_files=20, eggs=5, depth=5):
+    """Generate a virtual environment shaped like a real one.
+
+    Args:
+        path (str): The path of the virtual environment. It must not exist.
+        scripts (int): The number of scripts in /bin. Every other one uses the
+            new style shebang for long paths.
+        pth_files (int): The number of .pth files within site-packages.
+        eggs (int): The number of eggs within site-packages. Each has its own
+            .pth file.
+        depth (int): The number of nested packages within each egg.
+
+    Returns:
+        VirtualEnvironment: The generated virtual environment.
+    """
+    path = os.path.abspath(path)
+    version = "python{0}.{1}".format(*sys.version_info[:2])
+    site_packages = os.path.join(path, "lib", version, "site-packages")
+    bin_dir = os.path.join(path, "bin")
+    os.makedirs(bin_dir)
+    os.makedirs(site_packages)
+    os.symlink(sys.executable, os.path.join(bin_dir, "python"))
+    os.symlink("python", os.path.join(bin_dir, version))
+    _write(
+        os.path.join(path, "pyvenv.cfg"),
+        "home = {0}\nversion = {1}.{2}.{3}\n".format(
+            os.path.dirname(sys.executable), *sys.version_info[:3]
+        ),
+    )
+    for name, template in ACTIVATES.items():
+
+        _write(os.path.join(bin_dir, name), template.format(path))
+
+    for count in range(scripts):
+
+        script = os.path.join(bin_dir, "script{0}".format(count))
+        _write(
+            script,
+            SHEBANGS[count % 2].format(path) + SCRIPT_BODY.format(count),
+        )
+        os.chmod(script, 0o755)
+
+    for count in range(pth_files):
+
+        _write(
+            os.path.join(site_packages, "pkg{0}.pth".format(count)),
+            "{0}/src/pkg{1}\nimport sys\n".format(path, count),
+        )
+
+    for count in range(eggs):
+
+        egg = os.path.join(site_packages, "egg{0}-1.0-py3.egg".format(count))
+        _write(os.path.join(egg, "egg{0}.pth".format(count)), egg + "\n")
+        package = egg
+        for level in range(depth):
+
+            package = os.path.join(package, "level{0}".format(level))
+            _write(os.path.join(package, "__init__.py"), "VALUE = 1\n")
+            _write(
+                os.path.join(
+                    package, "__pycache__", "__init__.cpython-3.pyc"
+                ),
+                "\0" * 64,
+            )
+
+    return api.VirtualEnvironment(path)
+
+
+def drop_caches():
+    """Drop the page cache so that files are read from the disk again.
+
+    This only works on Linux and needs root.
+    """
+    os.sync()
+    with open("/proc/sys/vm/drop_caches", "w") as drop:
+
+        drop.write("3\n")
+
+
+def _time(func, repeat, setup=None):
+    """Get the best and mean seconds of calling a function repeatedly.
+
+    The setup function, if any, is called untimed before each call.
+    """
+    timings = []
+    for _ in range(repeat):
+
+        if setup is not None:
+
+            setup()
+
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+
+    return min(timings), sum(timings) / len(timings)
+
+
+def run(args):
+    """Generate the virtual environment and time each operation.
+
+    Returns:
+        tuple: A list of the name, best seconds, and mean seconds of each
+        operation and the RelocateStats summed across the relocate runs.
+    """
+    workdir = tempfile.mkdtemp(prefix="venvctrl-bench-", dir=args.dir)
+    try:
+
+        first = os.path.join(workdir, "venv")
+        second = os.path.join(workdir, "moved")
+        options = dict(workers=args.jobs, full_scan=args.full_scan)
+        paths = [first, second]
+        stats = RelocateStats()
+        venv = None
+
+        def build():
+            # Relocating does not change the path the files are found at so
+            # each run starts from a fresh virtual environment.
+            nonlocal venv
+            shutil.rmtree(first, ignore_errors=True)
+            venv = build_venv(
+                first, args.scripts, args.pth, args.eggs, args.depth
+            )
+
+        def setup_relocate():
+            build()
+            if args.drop_caches:
+
+                drop_caches()
+
+        def setup_move():
+            if args.drop_caches:
+
+                drop_caches()
+
+        def relocate():
+            venv.relocate(second, stats=stats, **options)
+
+        def rescan():
+            # Every file is read again but nothing is left to rewrite.
+            venv.relocate(second, **options)
+
+        def move():
+            # Moving does change the path so the runs alternate between two.
+            paths.reverse()
+            venv.move(paths[0], **options)
+
+        def cmd_path_cold():
+            api.VirtualEnvironment(venv.path).cmd_path("python")
+
+        def cmd_path_warm():
+            for count in range(args.scripts):
+
+                venv.cmd_path("script{0}".format(count))
+
+        results = [
+            ("relocate",) + _time(relocate, args.repeat, setup_relocate)
+        ]
+        build()
+        venv.relocate(second, **options)
+        results.append(
+            ("relocate (unchanged)",) + _time(rescan, args.repeat, setup_move)
+        )
+        build()
+        results.append(("move",) + _time(move, args.repeat, setup_move))
+        results.append(
+            ("cmd_path (cold)",) + _time(cmd_path_cold, args.repeat)
+        )
+        results.append(
+            ("cmd_path (warm, {0} lookups)".format(args.scripts),)
+            + _time(cmd_path_warm, args.repeat)
+        )
+        return results, stats
+
+    finally:
+
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def main():
+    """Benchmark relocating synthetic virtual environments."""
+    parser = argparse.ArgumentParser(
+        description="Benchmark relocating synthetic virtual environments."
+    )
+    parser.add_argument(
+        "--scripts", help="Scripts in /bin.", default=100, type=int
+    )
+    parser.add_argument(
+        "--pth", help=".pth files in site-packages.", default=20, type=int
+    )
+    parser.add_argument(
+        "--eggs", help="Eggs in site-packages.", default=5, type=int
+    )
+    parser.add_argument(
+        "--depth", help="Nested packages in each egg.", default=5, type=int
+    )
+    parser.add_argument(
+        "--repeat", help="Times to run each operation.", default=5, type=int
+    )
+    parser.add_argument(
+        "--jobs", help="Files to relocate in parallel.", default=None, type=int
+    )
+    parser.add_argument(
+        "--full-scan",
+        help="Rewrite the path within every text file.",
+        default=False,
+        action="store_true",
+    )
+    parser.add_argument(
+        "--drop-caches",
+        help=(
+            "Drop the page cache before each relocate and move. This needs "
+            "root on Linux."
+        ),
+        default=False,
+        action="store_true",
+    )
+    parser.add_argument(
+        "--stats",
+        help="Print the relocation stats summed across every run.",
+        default=False,
+        action="store_true",
+    )
+    parser.add_argument(
+        "--dir",
+        help="The directory to generate the virtual environment within.",
+        default=None,
+    )
+    args = parser.parse_args()
+    if args.repeat < 1:
+
+        parser.error("--repeat must be a positive number.")
+
+    results, stats = run(args)
+    print("{0:<32} {1:>10} {2:>10}".format("operation", "best", "mean"))
+    for name, best, mean in results:
+
+        print("{0:<32} {1:>10.4f} {2:>10.4f}".format(name, best, mean))
+
+    if args.stats:
+
+        print()
+        print(stats)
+
+
+if __name__ == "__main__":
+
+    main()
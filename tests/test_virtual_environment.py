@@ -5,10 +5,15 @@ from __future__ import absolute_import
 from __future__ import print_function
 from __future__ import unicode_literals
 
+import asyncio
 import os
 import subprocess
+import tarfile
 
 from venvctrl import api
+from venvctrl.venv import base
+from venvctrl.venv import create
+from venvctrl.venv import relocate
 
 
 def test_create(random, tmpdir):
@@ -117,3 +122,380 @@ def test_relocate_no_original_path(venv):
                     continue
                 for line in lines:
                     assert original_path not in line, file_.abspath
+
+
+def test_walk_prune(tmpdir):
+    """Test that the tree walker lists each directory once and prunes."""
+    root = tmpdir.mkdir("walk")
+    root.mkdir("bin").join("python").write("")
+    site = root.mkdir("lib").mkdir("python3").mkdir("site-packages")
+    site.join("eggs.pth").write("")
+    site.mkdir("__pycache__").join("cached.pyc").write("")
+    root.mkdir("include").join("header.h").write("")
+    venv = api.VirtualEnvironment(str(root))
+
+    def prune(dir_):
+        return dir_.name in ("__pycache__", "include")
+
+    seen = []
+    found = []
+    for current, dirs, files in venv.walk(prune=prune):
+        seen.append(current.path)
+        assert all(dir_.is_dir for dir_ in dirs)
+        found.extend(file_.name for file_ in files)
+
+    assert len(seen) == len(set(seen))
+    assert sorted(found) == ["eggs.pth", "python"]
+    assert isinstance(next(venv.bin.files), base.BinFile)
+
+
+def test_shebang_rewrite(tmpdir):
+    """Test that shebangs are rewritten in one pass and binaries skipped."""
+    script = tmpdir.join("script")
+    script.write_binary(
+        b"#!/bin/sh\n'''exec' /old/bin/python \"$0\" \"$@\"\n' '''\nbody\n"
+    )
+    script.chmod(0o751)
+    binary = tmpdir.join("binary")
+    binary.write_binary(b"\x7fELF#!/old/bin/python\n")
+    link = tmpdir.join("link")
+    link.mksymlinkto(script)
+
+    assert base.BinFile(str(binary)).shebang is None
+    assert base.BinFile(str(script)).shebang == os.linesep.join(
+        ["#!/bin/sh", "'''exec' /old/bin/python \"$0\" \"$@\"", "' '''"]
+    )
+    assert not base.BinFile(str(binary)).update_shebang(lambda _: "#!/x")
+    base.BinFile(str(link)).shebang = os.linesep.join(
+        ["#!/bin/sh", "'''exec' /a/much/longer/bin/python \"$0\" \"$@\"", "' '''"]
+    )
+    assert script.read_binary().endswith(b"' '''\nbody\n")
+    assert b"/a/much/longer/bin/python" in script.read_binary()
+    assert script.stat().mode & 0o777 == 0o751
+    assert link.islink()
+    assert binary.read_binary() == b"\x7fELF#!/old/bin/python\n"
+
+
+def test_relocate_parallel_errors(venv):
+    """Test that a failure in parallel relocation changes no file."""
+    path = "/testpath"
+    broken = os.path.join(venv.abspath, "broken.pth")
+    with open(broken, "wb") as pth_file:
+
+        pth_file.write(b"\xff\xfe")
+
+    try:
+        venv.relocate(path, workers=4)
+    except relocate.RelocateError as exc:
+        assert list(exc.errors) == [broken]
+    else:
+        assert False, "Expected a RelocateError."
+
+    for activate in venv.bin.activates:
+
+        assert activate.vpath == venv.abspath
+
+    with open(venv.bin.abspath + "/pip", "rb") as pip_file:
+
+        assert pip_file.read().startswith(
+            "#!{0}".format(venv.abspath).encode("utf8")
+        )
+
+    assert not [
+        name for name in os.listdir(venv.bin.abspath) if name.startswith(".")
+    ]
+
+
+def test_relocate_manifest(venv):
+    """Test that repeated relocations with a manifest find new files."""
+    venv.relocate("/stage", manifest=True)
+    assert venv.manifest.contents["vpath"] == "/stage"
+
+    egg = os.path.join(venv.abspath, "lib", "new.egg")
+    os.makedirs(egg)
+    with open(os.path.join(egg, "new.pth"), "w") as pth_file:
+
+        pth_file.write("/stage/lib/new.egg")
+
+    path = "/a/longer/testpath"
+    venv.relocate(path, manifest=True)
+    assert venv.manifest.contents["vpath"] == path
+    with open(os.path.join(egg, "new.pth"), "r") as pth_file:
+
+        assert pth_file.read() == "{0}/lib/new.egg".format(path)
+
+    for activate in venv.bin.activates:
+
+        assert activate.vpath == path
+
+    for script in venv.bin.files:
+
+        if script.shebang and "python" in script.shebang:
+
+            assert path in script.shebang
+
+    venv.relocate("/testpath")
+    assert not venv.manifest.exists
+
+
+def test_relocate_manifest_full_scan(venv):
+    """Test that a full scan is not limited by a narrower manifest."""
+    record = os.path.join(venv.abspath, "lib", "RECORD")
+    with open(record, "w") as record_file:
+
+        record_file.write("{0}/bin/pip,,\n".format(venv.abspath))
+
+    venv.relocate("/stage", manifest=True)
+    assert venv.manifest.contents["full_scan"] is False
+    venv.relocate("/final", manifest=True, full_scan=True)
+    assert venv.manifest.contents["full_scan"] is True
+    with open(record, "r") as record_file:
+
+        assert record_file.read() == "/final/bin/pip,,\n"
+
+    for activate in venv.bin.activates:
+
+        assert activate.vpath == "/final"
+
+
+def test_relocate_full_scan(venv):
+    """Test that a full scan rewrites text files and skips binary ones."""
+    path = "/testpath"
+    original_path = venv.abspath
+    text = os.path.join(venv.abspath, "lib", "RECORD")
+    with open(text, "w") as text_file:
+
+        text_file.write("{0}/lib\n{0}2/lib\n".format(original_path))
+
+    binary = os.path.join(venv.abspath, "lib", "data.bin")
+    with open(binary, "wb") as binary_file:
+
+        binary_file.write(b"\0" + original_path.encode("utf8"))
+
+    venv.relocate(path, full_scan=True)
+    with open(text, "r") as text_file:
+
+        assert text_file.read() == "{0}/lib\n{1}2/lib\n".format(
+            path, original_path
+        )
+
+    with open(binary, "rb") as binary_file:
+
+        assert binary_file.read() == b"\0" + original_path.encode("utf8")
+
+
+def test_copy_and_archive(venv, tmpdir):
+    """Test that relocated copies leave the original untouched."""
+    original_path = venv.abspath
+    path = str(tmpdir.join("copied"))
+    copied = venv.copy(path, workers=4)
+    for activate in venv.bin.activates:
+
+        assert activate.vpath == original_path
+
+    for activate in copied.bin.activates:
+
+        assert activate.vpath == path
+
+    assert copied.python("-c 'import sys; print(sys.prefix)'").out.strip() == path
+
+    archive_path = str(tmpdir.join("venv.tar.gz"))
+    venv.archive(archive_path, "/testpath", compression="gz")
+    with tarfile.open(archive_path) as archive:
+
+        pip = archive.extractfile("testpath/bin/pip").read()
+
+    assert pip.startswith(b"#!/testpath/bin/python")
+    with open(venv.bin.abspath + "/pip", "rb") as pip_file:
+
+        assert pip_file.read().startswith(
+            "#!{0}".format(original_path).encode("utf8")
+        )
+
+
+def test_package_index(tmpdir):
+    """Test that installed packages are found from their metadata."""
+    site = tmpdir.mkdir("index").mkdir("lib").mkdir("python3").mkdir(
+        "site-packages"
+    )
+    site.mkdir("Foo_Bar-1.0.dist-info").join("METADATA").write(
+        "Metadata-Version: 2.1\nName: Foo_Bar\nVersion: 1.0\n\nName: Other\n"
+    )
+    site.join("legacy-2.0-py3.egg-info").write("Name: Legacy\nVersion: 2.0\n")
+    venv = api.VirtualEnvironment(str(tmpdir.join("index")))
+
+    assert venv.installed_versions() == {"foo-bar": "1.0", "legacy": "2.0"}
+    assert venv.has_packages(["foo.bar", "FOO-BAR", "foo", "legacy"]) == {
+        "foo.bar": True,
+        "FOO-BAR": True,
+        "foo": False,
+        "legacy": True,
+    }
+
+    site.mkdir("foo-3.0.dist-info").join("METADATA").write(
+        "Name: foo\nVersion: 3.0\n"
+    )
+    os.utime(str(site), ns=(0, 0))
+    assert venv.has_package("foo")
+
+
+def test_async_commands(venv):
+    """Test running commands concurrently without blocking."""
+    lines = []
+    limit = asyncio.Semaphore(2)
+
+    async def run():
+        results = await asyncio.gather(
+            *(
+                venv.apython(
+                    "-c 'print({0}); print(1)'".format(count),
+                    limit=limit,
+                    on_stdout=lines.append,
+                )
+                for count in range(4)
+            )
+        )
+        try:
+            await venv.apython(
+                "-c 'import time; time.sleep(30)'", timeout=0.5
+            )
+        except subprocess.TimeoutExpired:
+            pass
+        else:
+            assert False, "Expected a timeout."
+        return results
+
+    results = asyncio.run(run())
+    assert [result.out.split() for result in results] == [
+        [str(count), "1"] for count in range(4)
+    ]
+    assert len(lines) == 8
+    assert venv.cmd_path("python") == os.path.join(venv.bin.path, "python")
+    with open(os.path.join(venv.bin.path, "new-command"), "w") as script:
+
+        script.write("#!/bin/sh\n")
+
+    assert venv.cmd_path("new-command").endswith("new-command")
+
+
+def test_create_from_cache(tmpdir):
+    """Test cloning new virtual environments from cached prototypes."""
+    cache = api.PrototypeCache(str(tmpdir.join("cache")), max_entries=1)
+    first = api.VirtualEnvironment(str(tmpdir.join("first")))
+    second = api.VirtualEnvironment(str(tmpdir.join("nested", "second")))
+    first.create(cache=cache)
+    second.create(cache=cache)
+    assert len(cache.entries()) == 1
+
+    for venv in (first, second):
+
+        for activate in venv.bin.activates:
+
+            assert activate.vpath == venv.abspath
+
+        prefix = venv.python("-c 'import sys; print(sys.prefix)'").out.strip()
+        assert prefix == venv.abspath
+
+    prototype = cache.entries()[0][0]
+    interpreter = os.path.realpath(
+        os.path.join(prototype, "venv", "bin", "python")
+    )
+    assert api.PrototypeCache.key() == api.PrototypeCache.key(interpreter)
+    first.relocate("/testpath", full_scan=True)
+    for activate in api.VirtualEnvironment(
+        os.path.join(prototype, "venv")
+    ).bin.activates:
+
+        assert activate.vpath == os.path.join(prototype, "venv")
+
+    third = api.VirtualEnvironment(str(tmpdir.join("third")))
+    third.create(system_site=True, cache=cache)
+    assert [entry[0] for entry in cache.entries()] != [prototype]
+    assert len(cache.entries()) == 1
+
+
+def test_relocate_stats(venv):
+    """Test that relocating reports the work done in each phase."""
+    stats = venv.relocate("/testpath", workers=2)
+    assert stats.phases["walk"]["count"] > 0
+    assert stats.phases["activates"]["count"] > 0
+    assert stats.phases["bin"]["count"] > 0
+    assert stats.phases["scan"]["count"] == 0
+    assert stats.files_rewritten > 0
+    assert stats.files_scanned >= stats.files_rewritten
+    assert stats.bytes_read > 0 and stats.bytes_written > 0
+    assert stats.as_dict()["phases"]["activates"] == stats.phases["activates"]
+    assert "activates" in str(stats)
+
+    stats = venv.relocate("/testpath")
+    assert stats.files_rewritten == 0
+
+
+def test_writeline_line_endings(tmpdir):
+    """Test that only real line endings count towards line numbers."""
+    path = tmpdir.join("lines.txt")
+    path.write_binary(b"a\x0cb\nc\nd\n")
+    base.VenvFile(str(path)).writeline("X", 1)
+    assert path.read_binary() == "a\x0cb\nX{0}d\n".format(os.linesep).encode()
+
+
+def test_copy_data_short_copy(tmpdir, monkeypatch):
+    """Test that a zero-copy call that stops short falls back."""
+    source = tmpdir.join("source")
+    target = tmpdir.join("target")
+    source.write_binary(b"venvctrl" * 1024)
+    monkeypatch.setattr(
+        relocate, "_ZERO_COPY", (lambda source, target, offset, count: 0,)
+    )
+    with open(str(source), "rb") as source_file:
+
+        with open(str(target), "wb") as target_file:
+
+            relocate._copy_data(
+                source_file.fileno(), target_file.fileno(), 8 * 1024
+            )
+
+    assert target.read_binary() == source.read_binary()
+
+
+def test_activate_crlf(tmpdir):
+    """Test that activate scripts with CRLF line endings are relocated."""
+    path = tmpdir.join("activate")
+    path.write_binary(b'deactivate\r\nVIRTUAL_ENV="/old/venv"\r\nexport PATH\r\n')
+    activate = base.ActivateFileBash(str(path))
+    assert activate.vpath == "/old/venv"
+    activate.vpath = "/new/venv"
+    assert path.read_binary() == b'deactivate\r\nVIRTUAL_ENV="/new/venv"\r\nexport PATH\r\n'
+
+
+def test_replace_keeps_metadata(tmpdir):
+    """Test that rewritten files keep their owner and extended attributes."""
+    path = tmpdir.join("script")
+    path.write_binary(b"#!/old/bin/python\n")
+    path.chmod(0o750)
+    owner, group = os.getuid(), os.getgid()
+    if owner == 0:
+
+        # Only root can give the file away to check that it is kept.
+        owner = group = 1234
+        os.chown(str(path), owner, group)
+
+    os.setxattr(str(path), "user.venvctrl", b"kept")
+
+    base.BinFile(str(path)).shebang = "#!/a/much/longer/bin/python"
+    assert path.read_binary() == b"#!/a/much/longer/bin/python\n"
+    assert path.stat().mode & 0o777 == 0o750
+    assert (path.stat().uid, path.stat().gid) == (owner, group)
+    assert os.getxattr(str(path), "user.venvctrl") == b"kept"
+
+
+def test_default_python_cached(monkeypatch):
+    """Test that the default interpreter is only resolved once."""
+    key = api.PrototypeCache.key()
+
+    def resolve(command):
+        raise AssertionError("virtualenv was resolved again")
+
+    monkeypatch.setattr(create, "_shebang_python", resolve)
+    monkeypatch.setattr(create, "_installed_python", resolve)
+    assert api.PrototypeCache.key() == key
@@ -21,3 +21,6 @@ class VirtualEnvironment(
 ):
 
     """Virtual environment management class."""
+
+
+PrototypeCache = create.PrototypeCache
@@ -6,26 +6,74 @@ from __future__ import print_function
 from __future__ import unicode_literals
 
 import argparse
+import sys
 
 from .. import api
+from ..venv.relocate import RelocateError
 
 
-def relocate(source, destination, move=False):
+# Archive file name suffixes and the tar compression they imply.
+ARCHIVE_COMPRESSION = (
+    (".tar.gz", "gz"),
+    (".tgz", "gz"),
+    (".tar.bz2", "bz2"),
+    (".tar.xz", "xz"),
+)
+
+
+def relocate(
+    source,
+    destination,
+    move=False,
+    jobs=None,
+    manifest=False,
+    full_scan=False,
+    archive=None,
+):
     """Adjust the virtual environment settings and optional move it.
 
     Args:
         source (str): Path to the existing virtual environment.
         destination (str): Desired path of the virtual environment.
         move (bool): Whether or not to actually move the files. Default False.
+        jobs (int): The number of files to relocate in parallel. Default is
+            None which relocates one file at a time.
+        manifest (bool): Whether or not to keep a relocation manifest within
+            the virtual environment. Default False.
+        full_scan (bool): Whether or not to rewrite the path within every text
+            file of the virtual environment. Default False.
+        archive (str): The path of a tar archive to write a relocated copy
+            into instead of changing the virtual environment. The move, jobs,
+            and manifest options do not apply to it. Default None.
+
+    Returns:
+        RelocateStats: The timings and counts of the relocation or None if an
+        archive was written.
     """
     venv = api.VirtualEnvironment(source)
-    if not move:
+    if archive:
+
+        compression = None
+        for suffix, name in ARCHIVE_COMPRESSION:
 
-        venv.relocate(destination)
+            if archive.endswith(suffix):
+
+                compression = name
+
+        venv.archive(
+            archive, destination, compression=compression, full_scan=full_scan
+        )
         return None
 
-    venv.move(destination)
-    return None
+    if not move:
+
+        return venv.relocate(
+            destination, workers=jobs, manifest=manifest, full_scan=full_scan
+        )
+
+    return venv.move(
+        destination, workers=jobs, manifest=manifest, full_scan=full_scan
+    )
 
 
 def main():
@@ -47,9 +95,81 @@ def main():
         default=False,
         action="store_true",
     )
+    parser.add_argument(
+        "--jobs",
+        help="The number of files to relocate in parallel.",
+        default=None,
+        type=int,
+    )
+    parser.add_argument(
+        "--manifest",
+        help="Keep a manifest to speed up later relocations.",
+        default=False,
+        action="store_true",
+    )
+    parser.add_argument(
+        "--full-scan",
+        help="Rewrite the path within every text file, not just scripts.",
+        default=False,
+        action="store_true",
+    )
+    parser.add_argument(
+        "--archive",
+        help=(
+            "Write a relocated copy to this tar archive instead. The "
+            "compression is chosen from the .tar.gz, .tgz, .tar.bz2, or "
+            ".tar.xz suffix."
+        ),
+        default=None,
+    )
+    parser.add_argument(
+        "--stats",
+        help="Print the time spent and files handled in each phase.",
+        default=False,
+        action="store_true",
+    )
 
     args = parser.parse_args()
-    relocate(args.source, args.destination, args.move)
+    if args.jobs is not None and args.jobs < 1:
+
+        parser.error("--jobs must be a positive number.")
+
+    if args.archive:
+
+        for flag, used in (
+            ("--move", args.move),
+            ("--jobs", args.jobs is not None),
+            ("--manifest", args.manifest),
+            ("--stats", args.stats),
+        ):
+
+            if used:
+
+                parser.error("{0} cannot be used with --archive.".format(flag))
+
+    try:
+
+        stats = relocate(
+            args.source,
+            args.destination,
+            args.move,
+            args.jobs,
+            args.manifest,
+            args.full_scan,
+            args.archive,
+        )
+
+    except RelocateError as exc:
+
+        for path, error in sorted(exc.errors.items()):
+
+            print("{0}: {1}".format(path, error), file=sys.stderr)
+
+        sys.exit(1)
+
+    if args.stats:
+
+        print(stats)
 
 
 if __name__ == "__main__":
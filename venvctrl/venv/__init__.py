@@ -0,0 +1,6 @@
+"""Virtual environment object interface and implementations."""
+
+from __future__ import division
+from __future__ import absolute_import
+from __future__ import print_function
+from __future__ import unicode_literals
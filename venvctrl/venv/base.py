@@ -0,0 +1,976 @@
+"""Virtual environment object interface."""
+
+from __future__ import division
+from __future__ import absolute_import
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import errno
+import io
+import json
+import os
+import re
+import stat
+import tempfile
+
+
+def _entry_check(check):
+    """Run a DirEntry type check, treating OS errors as a negative result.
+
+    This mirrors the os.path.isfile family which return False rather than
+    raising when the path cannot be inspected.
+    """
+    try:
+
+        return check()
+
+    except OSError:
+
+        return False
+
+
+def _scandir(path):
+    """Get a list of the os.DirEntry values within a directory."""
+    with os.scandir(path) as entries:
+
+        return list(entries)
+
+
+# Leading bytes of the compiled executable formats that may appear in /bin.
+_BINARY_MAGIC = (
+    b"\x7fELF",
+    b"\xfe\xed\xfa\xce",
+    b"\xce\xfa\xed\xfe",
+    b"\xfe\xed\xfa\xcf",
+    b"\xcf\xfa\xed\xfe",
+    b"\xca\xfe\xba\xbe",
+)
+
+
+def _line_end(content, start):
+    """Get the offset just past the line that begins at start."""
+    end = content.find(b"\n", start)
+    return len(content) if end < 0 else end + 1
+
+
+def _shebang_end(content):
+    """Get the offset just past the shebang lines of a script.
+
+    Args:
+        content (bytes): The contents of the script.
+
+    Returns:
+        int: The length of the shebang or 0 if there is none.
+    """
+    if not content.startswith(b"#!"):
+
+        return 0
+
+    end = _line_end(content, 0)
+    # Check if we're using the new style shebang
+    if content[:end] == b"#!/bin/sh\n" and content.startswith(b"'''exec'", end):
+
+        end = _line_end(content, _line_end(content, end))
+
+    return end
+
+
+def _patch(path, original, content):
+    """Overwrite only the span of bytes that differs between two contents."""
+    size = len(content)
+    start = 0
+    while start < size and original[start] == content[start]:
+
+        start += 1
+
+    if start == size:
+
+        return None
+
+    end = size
+    while original[end - 1] == content[end - 1]:
+
+        end -= 1
+
+    with open(path, "r+b") as file_handle:
+
+        file_handle.seek(start)
+        file_handle.write(content[start:end])
+
+    return None
+
+
+def _copy_xattrs(source, target):
+    """Copy the extended attributes, including any ACLs, of a file.
+
+    Like shutil.copystat, attributes the file system or the current user
+    cannot copy are skipped.
+    """
+    if not hasattr(os, "listxattr"):
+
+        return None
+
+    try:
+
+        names = os.listxattr(source)
+
+    except OSError as exc:
+
+        if exc.errno not in (errno.ENOTSUP, errno.ENODATA, errno.EINVAL):
+
+            raise
+
+        return None
+
+    for name in names:
+
+        try:
+
+            os.setxattr(target, name, os.getxattr(source, name))
+
+        except OSError as exc:
+
+            if exc.errno not in (
+                errno.EPERM,
+                errno.EACCES,
+                errno.ENOTSUP,
+                errno.ENODATA,
+                errno.EINVAL,
+            ):
+
+                raise
+
+    return None
+
+
+def _stage(path, content):
+    """Write new content for a file to a temporary file beside it.
+
+    Returns:
+        str: The path of the temporary file which has the permissions, owner,
+        and extended attributes of the original and is ready to replace it.
+    """
+    directory, name = os.path.split(path)
+    original = os.stat(path)
+    handle, tmp_path = tempfile.mkstemp(prefix=".{0}.".format(name), dir=directory)
+    try:
+
+        with os.fdopen(handle, "wb") as tmp_file:
+
+            tmp_file.write(content)
+
+        try:
+
+            os.chown(tmp_path, original.st_uid, original.st_gid)
+
+        except OSError as exc:
+
+            # Only privileged users may give a file away.
+            if exc.errno != errno.EPERM:
+
+                raise
+
+        _copy_xattrs(path, tmp_path)
+        # Changing the owner clears the setuid and setgid bits so the mode is
+        # copied last.
+        os.chmod(tmp_path, stat.S_IMODE(original.st_mode))
+
+    except BaseException:
+
+        os.unlink(tmp_path)
+        raise
+
+    return tmp_path
+
+
+def _replace(path, content):
+    """Atomically replace a file with new content, keeping its metadata."""
+    tmp_path = _stage(path, content)
+    try:
+
+        os.replace(tmp_path, path)
+
+    except BaseException:
+
+        os.unlink(tmp_path)
+        raise
+
+
+class VenvPath(object):
+
+    """A path in the virtual environment."""
+
+    def __init__(self, path, entry=None):
+        """Initialize the VenvPath with a file system path.
+
+        Args:
+            path (str): A file system path.
+            entry (os.DirEntry): An optional entry produced by os.scandir for
+                the path. When given, the type checks use the information
+                cached on the entry instead of issuing a new stat call.
+        """
+        self._path = path
+        self._entry = entry
+
+    @property
+    def path(self):
+        """Get the original path."""
+        return self._path
+
+    @property
+    def name(self):
+        """Get the final component of the path."""
+        return os.path.basename(self.path)
+
+    @property
+    def abspath(self):
+        """The the absolute path for the item."""
+        return os.path.abspath(self.path)
+
+    @property
+    def realpath(self):
+        """Get the path with symbolic links resolved."""
+        return os.path.realpath(self.path)
+
+    @property
+    def is_absolute(self):
+        """Get if the path is an absolute path."""
+        return os.path.isabs(self.path)
+
+    @property
+    def is_file(self):
+        """Get if the path is a file object."""
+        if self._entry is not None:
+
+            return _entry_check(self._entry.is_file)
+
+        return os.path.isfile(self.path)
+
+    @property
+    def is_dir(self):
+        """Get if the path is a directory object."""
+        if self._entry is not None:
+
+            return _entry_check(self._entry.is_dir)
+
+        return os.path.isdir(self.path)
+
+    @property
+    def is_link(self):
+        """Get if the path is a symbolic link."""
+        if self._entry is not None:
+
+            return _entry_check(self._entry.is_symlink)
+
+        return os.path.islink(self.path)
+
+    @property
+    def exists(self):
+        """Get if the path exists."""
+        return os.path.exists(self.path)
+
+
+class VenvFile(VenvPath):
+
+    """A file within a virtual environment."""
+
+    def read(self):
+        """Get the contents of the file as bytes."""
+        with open(self.path, "rb") as file_handle:
+
+            return file_handle.read()
+
+    def write(self, content, original=None):
+        """Replace the contents of the file.
+
+        The content is written to a temporary file in the same directory
+        which then atomically replaces the original, keeping its permissions,
+        owner, and extended attributes. Symbolic links are resolved so that the link itself is preserved.
+
+        Args:
+            content (bytes): The new contents of the file.
+            original (bytes): The current contents of the file, if already
+                read. When given and the same length as the new content, only
+                the changed bytes are patched in place unless the file is hard
+                linked to another path which must not change with it.
+        """
+        path = self.realpath
+        if (
+            original is not None
+            and len(original) == len(content)
+            and os.stat(path).st_nlink == 1
+        ):
+
+            _patch(path, original, content)
+            return None
+
+        _replace(path, content)
+        return None
+
+    def writeline(self, line, line_number):
+        """Rewrite a single line in the file.
+
+        Args:
+            line (str): The new text to write to the file.
+            line_number (int): The line of the file to rewrite. Numbering
+                starts at 0.
+        """
+        if not line.endswith(os.linesep):
+
+            line += os.linesep
+        original = self.read()
+        # Unlike str.splitlines, this only breaks lines on the same line
+        # endings as reading the file in text mode.
+        lines = io.StringIO(original.decode("utf8"), newline="").readlines()
+        if line_number < len(lines):
+
+            lines[line_number] = line
+
+        self.write("".join(lines).encode("utf8"), original)
+
+    def replace(self, old, new):
+        """Replace old with new in every occurrence.
+
+        Args:
+            old (str): The original text.
+            new (str): The new text.
+        """
+        original = self.read()
+        content = original.decode("utf8").replace(old, new)
+        self.write(content.encode("utf8"), original)
+
+
+class VenvDir(VenvPath):
+
+    """A directory within a virtual environment."""
+
+    def _new_file(self, path, entry=None):
+        """Get the VenvFile type used for files within the directory."""
+        return VenvFile(path, entry)
+
+    def _new_dir(self, path, entry=None):
+        """Get the VenvDir type used for directories within the directory."""
+        return VenvDir(path, entry)
+
+    def _scan(self):
+        """List the directory exactly once.
+
+        Returns:
+            tuple: A list of VenvDirs and a list of VenvFiles. Entries that are
+            neither, such as broken symbolic links, are left out of both.
+        """
+        dirs = []
+        files = []
+        for entry in _scandir(self.path):
+
+            if _entry_check(entry.is_dir):
+
+                dirs.append(self._new_dir(entry.path, entry))
+
+            elif _entry_check(entry.is_file):
+
+                files.append(self._new_file(entry.path, entry))
+
+        return dirs, files
+
+    @property
+    def paths(self):
+        """Get an iter of VenvPaths within the directory."""
+        contents = _scandir(self.path)
+        contents = (VenvPath(entry.path, entry) for entry in contents)
+        return contents
+
+    @property
+    def files(self):
+        """Get an iter of VenvFiles within the directory."""
+        return iter(self._scan()[1])
+
+    @property
+    def dirs(self):
+        """Get an iter of VenvDirs within the directory."""
+        return iter(self._scan()[0])
+
+    @property
+    def items(self):
+        """Get an iter of VenvDirs and VenvFiles within the directory."""
+        contents = _scandir(self.path)
+        contents = (
+            self._new_file(entry.path, entry)
+            if _entry_check(entry.is_file)
+            else self._new_dir(entry.path, entry)
+            for entry in contents
+        )
+        return contents
+
+    def walk(self, prune=None, followlinks=False):
+        """Walk the directory tree top-down, listing each directory once.
+
+        Each step yields a tuple of the current VenvDir, a list of the VenvDirs
+        within it, and a list of the VenvFiles within it. Like os.walk, the
+        list of VenvDirs may be modified in place to control which
+        directories are visited next.
+
+        Args:
+            prune (callable): An optional predicate that is given each VenvDir
+                found during the walk. Directories for which it returns True
+                are removed from the results and never listed. For example,
+                ``lambda d: d.name == "__pycache__"`` skips bytecode caches.
+            followlinks (bool): Whether or not to descend into symbolic links
+                that point to directories. Default is False.
+
+        Yields:
+            tuple: The VenvDir, a list of VenvDirs, and a list of VenvFiles.
+        """
+        pending = [self]
+        while pending:
+
+            current = pending.pop()
+            dirs, files = current._scan()
+            if prune is not None:
+
+                dirs = [dir_ for dir_ in dirs if not prune(dir_)]
+
+            yield current, dirs, files
+            pending.extend(
+                dir_
+                for dir_ in reversed(dirs)
+                if followlinks or not dir_.is_link
+            )
+
+    def __iter__(self):
+        """Iter over items."""
+        return iter(self.items)
+
+
+class BinFile(VenvFile):
+
+    """An executable file from a virtual environment."""
+
+    def _read_script(self, whole=True):
+        """Read the file if it begins with a shebang.
+
+        Compiled executables are recognised by their leading magic bytes and
+        are never read beyond them.
+
+        Args:
+            whole (bool): Whether to read the whole file or stop at the end of
+                the shebang. Default is True.
+
+        Returns:
+            bytes: The file contents or None if the file has no shebang.
+        """
+        with open(self.path, "rb") as file_handle:
+
+            head = file_handle.read(4)
+            if head.startswith(_BINARY_MAGIC) or not head.startswith(b"#!"):
+
+                return None
+
+            if whole:
+
+                return head + file_handle.read()
+
+            content = head + file_handle.readline()
+            if content == b"#!/bin/sh\n":
+
+                # The new style shebang continues over two more lines.
+                content += file_handle.readline()
+                content += file_handle.readline()
+
+            return content
+
+    @staticmethod
+    def _decode_shebang(content):
+        """Get the shebang text from the contents of a script."""
+        header = content[:_shebang_end(content)]
+        return os.linesep.join(
+            line.decode("utf8").strip() for line in header.splitlines()
+        )
+
+    @property
+    def shebang(self):
+        """Get the file shebang if is has one."""
+        content = self._read_script(whole=False)
+        if content is None:
+
+            return None
+
+        return self._decode_shebang(content)
+
+    @shebang.setter
+    def shebang(self, new_shebang):
+        """Write a new shebang to the file.
+
+        Raises:
+            ValueError: If the file has no shebang to modify.
+            ValueError: If the new shebang is invalid.
+        """
+        if new_shebang is None:
+
+            raise ValueError("New shebang cannot be None.")
+
+        if not self.update_shebang(lambda _: new_shebang):
+
+            raise ValueError("Cannot modify a shebang if it does not exist.")
+
+    def update_shebang(self, update):
+        """Rewrite the shebang based on its current value.
+
+        The file is read once and only the shebang lines are replaced before
+        the content is written back.
+
+        Args:
+            update (callable): Given the current shebang, returns the new
+                shebang or None to leave the file untouched.
+
+        Returns:
+            bool: True if the file has a shebang else False.
+
+        Raises:
+            ValueError: If the new shebang is invalid.
+        """
+        original = self._read_script()
+        if original is None:
+
+            return False
+
+        content = self._rewrite_shebang(original, update)
+        if content is None:
+
+            return False
+
+        if content is not original:
+
+            self.write(content, original)
+
+        return True
+
+    def _rewrite_shebang(self, content, update):
+        """Get the contents of a script with its shebang rewritten.
+
+        Args:
+            content (bytes): The contents of the script.
+            update (callable): See `update_shebang`.
+
+        Returns:
+            bytes: The new contents, the given contents if update returned
+            None, or None if there is no shebang.
+
+        Raises:
+            ValueError: If the new shebang is invalid.
+        """
+        old_shebang = self._decode_shebang(content)
+        if not old_shebang:
+
+            return None
+
+        new_shebang = update(old_shebang)
+        if new_shebang is None:
+
+            return content
+
+        old_shebang = old_shebang.strip().split(os.linesep)
+        new_shebang = new_shebang.strip().split(os.linesep)
+
+        if len(old_shebang) != len(new_shebang):
+
+            raise ValueError(
+                "Old and new shebangs must " "be same number of lines"
+            )
+
+        if not new_shebang[0].startswith("#!"):
+
+            raise ValueError("Invalid shebang.")
+
+        header = "".join(line + os.linesep for line in new_shebang)
+        return header.encode("utf8") + content[_shebang_end(content):]
+
+
+class ActivateFile(BinFile):
+
+    """A common base for all activate scripts.
+
+    Implementations should replace the read_pattern for cases where the path can
+    be extracted with a regex. More complex use cases should override the
+    _find_vpath method to perform a search and return the appropriate path.
+    """
+
+    read_pattern = re.compile(r"""^VIRTUAL_ENV=["']([^"']*)["']$""")
+
+    def _find_vpath(self, content=None):
+        """
+        Find the VIRTUAL_ENV path entry.
+
+        Args:
+            content (str): The text of the file, if already read.
+
+        Returns:
+            tuple: A tuple containing the matched line, the old vpath, and the line number where the virtual
+            path was found. If the virtual path is not found, returns a tuple of three None values.
+        """
+        if content is None:
+
+            content = self.read().decode("utf8")
+
+        # Like reading in text mode, treat every line ending the same.
+        for count, line in enumerate(io.StringIO(content, newline=None)):
+
+            match = self.read_pattern.match(line)
+            if match:
+
+                return match.group(0), match.group(1).strip(), count
+
+        return None, None, None
+
+    @property
+    def vpath(self):
+        """Get the path to the virtual environment."""
+        return self._find_vpath()[1]
+
+    @vpath.setter
+    def vpath(self, new_vpath):
+        """Change the path to the virtual environment.
+
+        Raises:
+            ValueError: If the file has no path to modify.
+        """
+        original = self.read()
+        self.write(self._rewrite_vpath(original, new_vpath), original)
+
+    def _rewrite_vpath(self, content, new_vpath):
+        """Get the contents of the file with the path replaced.
+
+        Args:
+            content (bytes): The contents of the file.
+            new_vpath (str): The new path to the virtual environment.
+
+        Returns:
+            bytes: The new contents.
+
+        Raises:
+            ValueError: If the file has no path to modify.
+        """
+        content = content.decode("utf8")
+        _, old_vpath, _ = self._find_vpath(content)
+        if old_vpath is None:
+
+            raise ValueError("Cannot modify a vpath if it does not exist.")
+
+        return content.replace(old_vpath, new_vpath).encode("utf8")
+
+
+class ActivateFileBash(ActivateFile):
+
+    """The virtual environment /bin/activate script.
+
+    This version accounts for differences between the virtualenv and venv
+    activation scripts for bash.
+    """
+
+    # The pattern to match a bash file's VIRTUAL_ENV path changed during the
+    # virtualenv/venv split and has evolved in both projects over time. The
+    # following pattern matches all known versions of the path for both
+    # virtualenv and venv.
+    #
+    # For historical context, the original virtualenv pattern was:
+    #
+    # > VIRTUAL_ENV="/path/to/virtualenv"
+    #
+    # which was originally matched using `^VIRTUAL_ENV=["'](.*)["']$`. The
+    # 20.26.6 release of virtualenv removed the quotations so they were made
+    # optional in the pattern with `^VIRTUAL_ENV=["']?(.*)["']?$`.
+    #
+    # When the venv package was added to the standard library it introduced a
+    # new activation script template:
+    #
+    # > export VIRTUAL_ENV="/path/to/venv"
+    #
+    # This text was indented and included the "export" prefix so it did not
+    # match the same pattern as virtualenv. For some time, this code made use of
+    # two distinct patterns to match either virtualenv or venv. The original
+    # venv pattern was `^ *export VIRTUAL_ENV=["'](.*)["']$`. After the 20.26.6
+    # release of virtualenv, I went ahead and made the quotes optional for venv
+    # as well in case it copied that behavior some day resulting in
+    # `^ *export VIRTUAL_ENV=["']?(.*)["']?$`.
+    #
+    # Another notable difference between venv and virtualenv is that the full
+    # path of the VIRTUAL_ENV variable is present multiple times in venv
+    # scripts. This wasn't always the case for venv but this condition existed
+    # by the time I added venv support. The virtualenv scripts will assign the
+    # value only once using the full path and any other assignment is based on a
+    # reference to the original variable rather than another copy of the path.
+    # The biggest example of this is adapting the unix path of the virtual
+    # environment to a cygwin path. The virtualenv template is this:
+    #
+    # > VIRTUAL_ENV=/path/to/virtualenv
+    # > if ([ "$OSTYPE" = "cygwin" ] || [ "$OSTYPE" = "msys" ]) && $(command -v cygpath &> /dev/null) ; then
+    # >     VIRTUAL_ENV=$(cygpath -u "$VIRTUAL_ENV")
+    # > fi
+    # > export VIRTUAL_ENV
+    #
+    # The venv template for the same logic is this:
+    #
+    # > if [ "${OSTYPE:-}" = "cygwin" ] || [ "${OSTYPE:-}" = "msys" ] ; then
+    # >     export VIRTUAL_ENV=$(cygpath "/workspaces/venvctrl/test")
+    # > else
+    # >    export VIRTUAL_ENV="/workspaces/venvctrl/test"
+    # > fi
+    #
+    # To account for this I refactored the path rewriting logic to rewrite all
+    # occurrences of the path rather than selectively rewriting only the single
+    # line that matched the pattern. However, there was a bug in the pattern
+    # used for venv that resulted in the Windows logic branch never being
+    # rewritten in a venv activation script. The main issue is that the pattern
+    # included a match for the end-of-line character which resulted in the
+    # rewrite logic only replacing the path in locations that ended in an
+    # immediate end-of-line. The path setting line in the Windows branch of a
+    # venv script does not end in a newline so it was left as-is. This likely
+    # went undetected because it only affected windows users and rpmvenv users
+    # who have explicitly swapped virtualenv for venv. To fix this, all
+    # extracted paths are now stripped of whitespace.
+    #
+    # There was a secondary and mostly benign bug in the pattern as well which
+    # is that it also matched the closing quote character if present. Generally,
+    # the activation scripts are consistent with quoting so this didn't affect
+    # functionality but I fixed it anyway by making the capture group used to
+    # extract the path valid only for non-quote characters with `([^"']*)`.
+    read_pattern = re.compile(r"""^\s*(?:export)?\s*VIRTUAL_ENV=\s*(?:\$\(cygpath\s*)?["']?([^"'\)]*)["']?\)?$""")
+
+
+class ActivateFishFile(ActivateFile):
+
+    """The virtual environment /bin/activate.fish script."""
+
+    read_pattern = re.compile(r"""^set -gx VIRTUAL_ENV ["']?([^"']*)["']?$""")
+
+
+class ActivateCshFile(ActivateFile):
+
+    """The virtual environment /bin/activate.csh script."""
+
+    read_pattern = re.compile(r"""^setenv VIRTUAL_ENV ["']?([^"']*)["']?$""")
+
+
+class ActivateXshFile(ActivateFile):
+
+    """The virtual environment /bin/activate.xsh script."""
+
+    read_pattern = re.compile(r"""^\$VIRTUAL_ENV = r["']?([^"']*)["']?$""")
+
+
+class ActivateNuFile(ActivateFile):
+
+    """The virtual environment /bin/activate.nu script.
+
+    Note that the NU shell activation script is different from previously
+    supported shells because it contains two references to the virtualenv path
+    rather than one. This is because it requires a specialized deactivate
+    script which is aliased to the deactivate command.
+
+    activate.nu:3 generated with virtualenv 20.13.3
+    let virtual-env = "/tmp/test_venv"
+
+    activate.nu:34 generated with virtualenv 20.21.0
+    ....let virtual_env = '/tmp/test_venv'
+    """
+
+    read_pattern = re.compile(r"""^\s*let virtual[-_]env = r?\#?["']?([^"']*)["']?\#?$""")
+
+
+class ActivateNuFileDeactivateAlias(ActivateFile):
+
+    """The virtual environment /bin/activate.nu script's deactivate alias.
+
+    This is the second part of the NU shell activation script modification
+    This is implemented as a second activate script as a convenience. The
+    ActivateFile base class only ever expected that a single line in the
+    activate script would contain the virtualenv path. NU shell is the first
+    script to break that expectation. Rather than re-write the ActivateFile
+    class, this class models the second line containing the path as a second
+    file in order to use the inherited regex matching logic.
+    """
+
+    read_pattern = re.compile(
+        r"""^alias deactivate = source ["'](.*)/bin/deactivate.nu["']$"""
+    )
+
+    @property
+    def exists(self):
+        """
+        Get if the path exists.
+
+        Overwite VenvPath property. The /bin/activate.nu scipt generated
+        by virtualenv>=20.14.0 does contain a virtual path anymore.
+        So, relocation is only required for older versions.
+
+        Returns:
+            bool: True if the /bin/activate.nu exists and it contains a virtual path
+                  for deactivate.
+        """
+
+        return os.path.exists(self.path) and self.vpath is not None
+
+
+class BinDir(VenvDir):
+
+    """Specialized VenvDir for the /bin directory."""
+
+    @property
+    def activates(self):
+        """Get an iter of activate files in the virtual environment."""
+        return (
+            activation
+            for activation in (
+                self.activate_sh,
+                self.activate_csh,
+                self.activate_fish,
+                self.activate_xsh,
+                self.activate_nu,
+                self.activate_nu_deactivate,
+            )
+            if activation.exists
+        )
+
+    @property
+    def activate_sh(self):
+        """Get the /bin/activate script."""
+        return ActivateFileBash(os.path.join(self.path, "activate"))
+
+    @property
+    def activate_csh(self):
+        """Get the /bin/activate.csh script."""
+        return ActivateCshFile(os.path.join(self.path, "activate.csh"))
+
+    @property
+    def activate_fish(self):
+        """Get the /bin/activate.fish script."""
+        return ActivateFishFile(os.path.join(self.path, "activate.fish"))
+
+    @property
+    def activate_xsh(self):
+        """Get the /bin/activate.xsh script."""
+        return ActivateXshFile(os.path.join(self.path, "activate.xsh"))
+
+    @property
+    def activate_nu(self):
+        """Get the /bin/activate.nu script."""
+        return ActivateNuFile(os.path.join(self.path, "activate.nu"))
+
+    @property
+    def activate_nu_deactivate(self):
+        """Get the /bin/activate.nu script.
+
+        This returns the same underlying file as the activate_nu property but
+        is configured to target all vpath operations to the secondary
+        virtualenv path reference that exists to set up the deactivate
+        command. Generally, any use of the activate_nu property to modify the
+        vpath must be repeated with this property as well. See the
+        ActivateNuFileDeactivateAlias class documentation for more information.
+        """
+        return ActivateNuFileDeactivateAlias(
+            os.path.join(self.path, "activate.nu")
+        )
+
+    def _new_file(self, path, entry=None):
+        """Get the VenvFile type used for files within the directory."""
+        return BinFile(path, entry)
+
+    def _new_dir(self, path, entry=None):
+        """Get the VenvDir type used for directories within the directory."""
+        return BinDir(path, entry)
+
+
+class ManifestFile(VenvFile):
+
+    """The relocation manifest stored within a virtual environment.
+
+    The manifest remembers the path that the last relocation wrote into the
+    virtual environment along with the size, modification time, and offsets
+    of that path for every file it considered. This allows later relocations
+    to skip files and directories that have not changed since.
+    """
+
+    version = 1
+
+    @property
+    def contents(self):
+        """Get the manifest data or None if there is no usable manifest."""
+        try:
+
+            with open(self.path, "r") as file_handle:
+
+                data = json.load(file_handle)
+
+        except (OSError, ValueError):
+
+            return None
+
+        if not isinstance(data, dict) or data.get("version") != self.version:
+
+            return None
+
+        return data
+
+    @contents.setter
+    def contents(self, data):
+        """Replace the manifest data."""
+        if not self.exists:
+
+            open(self.path, "a").close()
+
+        data = dict(data, version=self.version)
+        self.write(json.dumps(data, sort_keys=True).encode("utf8"))
+
+    def remove(self):
+        """Delete the manifest if present."""
+        try:
+
+            os.unlink(self.path)
+
+        except FileNotFoundError:
+
+            pass
+
+
+class VirtualEnvironment(VenvDir):
+
+    """A virtual environment on a system."""
+
+    @property
+    def bin(self):
+        """Get the /bin directory."""
+        return BinDir(os.path.join(self.path, "bin"))
+
+    @property
+    def include(self):
+        """Get the /include directory."""
+        return VenvDir(os.path.join(self.path, "include"))
+
+    @property
+    def lib(self):
+        """Get the /lib directory."""
+        return VenvDir(os.path.join(self.path, "lib"))
+
+    @property
+    def local(self):
+        """Get the /local directory."""
+        return VenvDir(os.path.join(self.path, "local"))
+
+    @property
+    def site_packages(self):
+        """Get an iter of the /lib/pythonX.Y/site-packages directories."""
+        if not self.lib.is_dir:
+
+            return iter(())
+
+        contents = (
+            VenvDir(os.path.join(path.path, "site-packages"))
+            for path in self.lib.dirs
+        )
+        contents = (path for path in contents if path.is_dir)
+        return contents
+
+    @property
+    def manifest(self):
+        """Get the relocation manifest file."""
+        return ManifestFile(os.path.join(self.path, ".venvctrl-manifest.json"))
@@ -0,0 +1,247 @@
+"""Virtual environment command mixin."""
+
+from __future__ import division
+from __future__ import absolute_import
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import asyncio
+import collections
+import os
+import shlex
+import subprocess
+import sys
+import weakref
+
+
+CommandResult = collections.namedtuple("CommandResult", ("code", "out", "err"))
+
+# The number of async commands that may run at once within an event loop
+# when no other limit is given.
+DEFAULT_CONCURRENCY = os.cpu_count() or 1
+# The longest line of output that async commands can stream.
+_LINE_LIMIT = 1024 * 1024
+_LIMITS = weakref.WeakKeyDictionary()
+
+
+def _default_limit():
+    """Get the concurrency limit shared by commands in the running loop."""
+    loop = asyncio.get_running_loop()
+    limit = _LIMITS.get(loop)
+    if limit is None:
+
+        limit = _LIMITS[loop] = asyncio.Semaphore(DEFAULT_CONCURRENCY)
+
+    return limit
+
+
+async def _read_lines(stream, callback, lines):
+    """Collect the lines of a stream, passing each to an optional callback."""
+    while True:
+
+        line = await stream.readline()
+        if not line:
+
+            return None
+
+        lines.append(line)
+        if callback is not None:
+
+            callback(line.decode("utf8"))
+
+
+class CommandMixin(object):
+
+    """Mixin which adds ability to execute commands."""
+
+    @staticmethod
+    def _execute(cmd):
+        """Run a command in a subshell."""
+        cmd_parts = shlex.split(cmd)
+        if sys.version_info[0] < 3:
+
+            cmd_parts = shlex.split(cmd.encode("ascii"))
+
+        proc = subprocess.Popen(
+            cmd_parts, stdout=subprocess.PIPE, stderr=subprocess.PIPE
+        )
+        out, err = proc.communicate()
+        if proc.returncode != 0:
+
+            raise subprocess.CalledProcessError(
+                returncode=proc.returncode, cmd=cmd, output=err
+            )
+
+        return CommandResult(
+            code=proc.returncode,
+            out=out.decode("utf8"),
+            err=err.decode("utf8"),
+        )
+
+    @staticmethod
+    async def _aexecute(
+        cmd, timeout=None, limit=None, on_stdout=None, on_stderr=None
+    ):
+        """Run a command in a subprocess without blocking the event loop.
+
+        Args:
+            cmd (str): The command to run.
+            timeout (float): The number of seconds to wait before the command
+                is killed. Default is None which waits forever.
+            limit (asyncio.Semaphore): Bounds the number of commands that run
+                at once. Default is a limit of DEFAULT_CONCURRENCY shared by
+                every command in the event loop.
+            on_stdout (callable): Called with each line of stdout as it is
+                written by the command.
+            on_stderr (callable): Called with each line of stderr as it is
+                written by the command.
+
+        Returns:
+            CommandResult: The exit code and complete output of the command.
+
+        Raises:
+            subprocess.CalledProcessError: If the command fails.
+            subprocess.TimeoutExpired: If the command does not finish in time.
+        """
+        if limit is None:
+
+            limit = _default_limit()
+
+        async with limit:
+
+            proc = await asyncio.create_subprocess_exec(
+                *shlex.split(cmd),
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+                limit=_LINE_LIMIT
+            )
+            out = []
+            err = []
+            try:
+
+                await asyncio.wait_for(
+                    asyncio.gather(
+                        _read_lines(proc.stdout, on_stdout, out),
+                        _read_lines(proc.stderr, on_stderr, err),
+                        proc.wait(),
+                    ),
+                    timeout,
+                )
+
+            except asyncio.TimeoutError:
+
+                raise subprocess.TimeoutExpired(
+                    cmd=cmd,
+                    timeout=timeout,
+                    output=b"".join(out),
+                    stderr=b"".join(err),
+                )
+
+            finally:
+
+                if proc.returncode is None:
+
+                    proc.kill()
+                    await proc.wait()
+
+        out = b"".join(out)
+        err = b"".join(err)
+        if proc.returncode != 0:
+
+            raise subprocess.CalledProcessError(
+                returncode=proc.returncode, cmd=cmd, output=err
+            )
+
+        return CommandResult(
+            code=proc.returncode,
+            out=out.decode("utf8"),
+            err=err.decode("utf8"),
+        )
+
+    def _commands(self):
+        """Get a mapping of command name to path within /bin.
+
+        The mapping is built once and only rebuilt when the modification time
+        of the /bin directory changes.
+        """
+        bin_dir = self.bin
+        try:
+
+            key = (bin_dir.path, os.stat(bin_dir.path).st_mtime_ns)
+
+        except OSError:
+
+            return {}
+
+        cached = getattr(self, "_command_paths", None)
+        if cached is not None and cached[0] == key:
+
+            return cached[1]
+
+        commands = {}
+        for binscript in bin_dir.files:
+
+            commands.setdefault(binscript.name, binscript.path)
+
+        self._command_paths = (key, commands)
+        return commands
+
+    def cmd_path(self, cmd):
+        """Get the path of a command in the virtual if it exists.
+
+        Args:
+            cmd (str): The command to look for.
+
+        Returns:
+            str: The full path to the command.
+
+        Raises:
+            ValueError: If the command is not present.
+        """
+        path = self._commands().get(cmd)
+        if path is None:
+
+            raise ValueError("The command {0} was not found.".format(cmd))
+
+        return path
+
+    def run(self, cmd):
+        """Execute a script from the virtual environment /bin directory."""
+        return self._execute(self.cmd_path(cmd))
+
+    def python(self, cmd):
+        """Execute a python script using the virtual environment python."""
+        python_bin = self.cmd_path("python")
+        cmd = "{0} {1}".format(python_bin, cmd)
+        return self._execute(cmd)
+
+    def pip(self, cmd):
+        """Execute some pip function using the virtual environment pip."""
+        pip_bin = self.cmd_path("pip")
+        cmd = "{0} {1}".format(pip_bin, cmd)
+        return self._execute(cmd)
+
+    async def arun(self, cmd, **kwargs):
+        """Execute a script from the /bin directory without blocking.
+
+        See `_aexecute` for the keyword arguments.
+        """
+        return await self._aexecute(self.cmd_path(cmd), **kwargs)
+
+    async def apython(self, cmd, **kwargs):
+        """Execute a python script using the virtual environment python.
+
+        See `_aexecute` for the keyword arguments.
+        """
+        python_bin = self.cmd_path("python")
+        cmd = "{0} {1}".format(python_bin, cmd)
+        return await self._aexecute(cmd, **kwargs)
+
+    async def apip(self, cmd, **kwargs):
+        """Execute some pip function using the virtual environment pip.
+
+        See `_aexecute` for the keyword arguments.
+        """
+        pip_bin = self.cmd_path("pip")
+        cmd = "{0} {1}".format(pip_bin, cmd)
+        return await self._aexecute(cmd, **kwargs)
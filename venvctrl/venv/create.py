@@ -0,0 +1,413 @@
+"""Virtual environment create mixin."""
+
+from __future__ import division
+from __future__ import absolute_import
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import errno
+import hashlib
+import json
+import os
+import shutil
+import subprocess
+import tempfile
+
+from . import base
+
+
+def _shebang_python(command):
+    """Get the interpreter a python script runs with from its shebang.
+
+    Returns:
+        str: The interpreter or None if the command is not a python script,
+        such as a shell wrapper.
+    """
+    shebang = base.BinFile(command).shebang
+    if not shebang:
+
+        return None
+
+    lines = shebang.splitlines()
+    words = lines[0][2:].split()
+    if len(lines) > 1 and lines[1].startswith("'''exec'"):
+
+        words = lines[1].split()[1:]
+
+    if words and os.path.basename(words[0]) == "env":
+
+        words = words[1:]
+
+    if not words or not os.path.basename(words[0]).startswith(
+        ("python", "pypy")
+    ):
+
+        return None
+
+    return shutil.which(words[0]) or words[0]
+
+
+def _installed_python(command):
+    """Get the interpreter of the environment virtualenv is installed into.
+
+    Returns:
+        str: The interpreter or None if it could not be found.
+    """
+    try:
+
+        output = subprocess.run(
+            [command, "--version"],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            timeout=60,
+        ).stdout.decode("utf8")
+
+    except (OSError, subprocess.SubprocessError):
+
+        return None
+
+    # The output is "virtualenv <version> from <package>/__init__.py".
+    _, _, package = output.strip().partition(" from ")
+    lib = package.rpartition(os.sep + "site-packages" + os.sep)[0]
+    if not lib:
+
+        return None
+
+    prefix = os.path.dirname(os.path.dirname(lib))
+    for candidate in (
+        os.path.join(prefix, "bin", os.path.basename(lib)),
+        os.path.join(prefix, "bin", "python3"),
+        os.path.join(prefix, "bin", "python"),
+        os.path.join(os.path.dirname(lib), "python.exe"),
+    ):
+
+        if os.path.isfile(candidate):
+
+            return candidate
+
+    return None
+
+
+# The path and modification time of the virtualenv command along with the
+# interpreter it was resolved to.
+_default_python_cache = None
+
+
+def _default_python():
+    """Get the interpreter virtualenv creates with when none is given.
+
+    That is the interpreter virtualenv itself runs with. When it cannot be
+    found, the virtualenv command stands in for it so that at least
+    reinstalling virtualenv is noticed. Finding it may run virtualenv so the
+    answer is kept until the virtualenv command is replaced.
+
+    Returns:
+        str: The interpreter or None if virtualenv is not installed.
+    """
+    global _default_python_cache
+    command = shutil.which("virtualenv")
+    if command is None:
+
+        return None
+
+    try:
+
+        key = (command, os.stat(command).st_mtime_ns)
+
+    except OSError:
+
+        return None
+
+    cached = _default_python_cache
+    if cached is not None and cached[0] == key:
+
+        return cached[1]
+
+    python = _shebang_python(command) or _installed_python(command) or command
+    _default_python_cache = (key, python)
+    return python
+
+
+class PrototypeCache(object):
+
+    """A cache of prototype virtual environments to clone new ones from.
+
+    The first virtual environment created for a given interpreter and set of
+    flags becomes a prototype within the cache directory. Later ones are
+    cloned from it: the files that contain the path of the prototype are
+    rewritten into the clone by the relocation machinery while every other
+    file shares its data with the prototype through a reflink or, where the
+    file system has none, a hard link.
+
+    Prototypes are evicted least recently used first whenever the cache grows
+    beyond its limits.
+    """
+
+    metadata_name = "prototype.json"
+
+    def __init__(self, path, max_size=None, max_entries=None):
+        """Initialize the cache.
+
+        Args:
+            path (str): The directory in which to keep the prototypes. It is
+                created when the first prototype is.
+            max_size (int): The most bytes of prototypes to keep. Default is
+                None which does not limit the size.
+            max_entries (int): The most prototypes to keep. Default is None
+                which does not limit the number.
+        """
+        self.path = os.path.abspath(path)
+        self.max_size = max_size
+        self.max_entries = max_entries
+
+    @staticmethod
+    def key(python=None, system_site=False, always_copy=False):
+        """Get the name of the prototype for a set of creation options.
+
+        The interpreter is resolved to its real path and modification time so
+        that upgrading it in place does not reuse a stale prototype. Without
+        one, the interpreter that virtualenv would use is resolved instead.
+
+        Args:
+            python (str): The name or path of a python interpreter.
+            system_site (bool): Whether or not to use the system site packages.
+            always_copy (bool): Whether or not to copy instead of symlinking.
+
+        Returns:
+            str: The name of the prototype within the cache.
+        """
+        interpreter = ""
+        python = python or _default_python()
+        if python:
+
+            interpreter = os.path.realpath(shutil.which(python) or python)
+            try:
+
+                mtime = os.stat(interpreter).st_mtime_ns
+
+            except OSError:
+
+                mtime = 0
+
+            interpreter = "{0}:{1}".format(interpreter, mtime)
+
+        options = json.dumps([interpreter, bool(system_site), bool(always_copy)])
+        return hashlib.sha256(options.encode("utf8")).hexdigest()[:32]
+
+    def entries(self):
+        """Get every complete prototype in the cache.
+
+        Returns:
+            list: A tuple of path, size in bytes, and last use time for each
+            prototype, least recently used first.
+        """
+        entries = []
+        try:
+
+            found = base._scandir(self.path)
+
+        except OSError as exc:
+
+            if exc.errno != errno.ENOENT:
+
+                raise
+
+            return entries
+
+        for entry in found:
+
+            if entry.name.startswith(".") or not entry.is_dir():
+
+                continue
+
+            try:
+
+                with open(os.path.join(entry.path, self.metadata_name)) as metadata:
+
+                    size = json.load(metadata)["size"]
+
+                last_used = entry.stat().st_mtime
+
+            except (OSError, ValueError, KeyError):
+
+                continue
+
+            entries.append((entry.path, size, last_used))
+
+        entries.sort(key=lambda item: item[2])
+        return entries
+
+    def evict(self, keep=None):
+        """Remove the least recently used prototypes beyond the limits.
+
+        Args:
+            keep (str): The path of a prototype which is never removed.
+                Default is None.
+        """
+        entries = self.entries()
+        count = len(entries)
+        size = sum(entry[1] for entry in entries)
+        for path, entry_size, _ in entries:
+
+            if not (
+                (self.max_entries is not None and count > self.max_entries)
+                or (self.max_size is not None and size > self.max_size)
+            ):
+
+                break
+
+            if path == keep:
+
+                continue
+
+            # Renaming first means the prototype is never seen half removed.
+            evicted = tempfile.mkdtemp(prefix=".evicted-", dir=self.path)
+            try:
+
+                os.rename(path, os.path.join(evicted, "prototype"))
+
+            except OSError:
+
+                continue
+
+            finally:
+
+                shutil.rmtree(evicted, ignore_errors=True)
+
+            count -= 1
+            size -= entry_size
+
+    def prototype(
+        self, venv_class, python=None, system_site=False, always_copy=False
+    ):
+        """Get the prototype for a set of options, creating it if needed.
+
+        Args:
+            venv_class (type): The virtual environment class of the prototype.
+            python (str): The name or path of a python interpreter.
+            system_site (bool): Whether or not to use the system site packages.
+            always_copy (bool): Whether or not to copy instead of symlinking.
+
+        Returns:
+            VirtualEnvironment: The prototype.
+        """
+        entry = os.path.join(
+            self.path, self.key(python, system_site, always_copy)
+        )
+        venv_path = os.path.join(entry, "venv")
+        if os.path.exists(os.path.join(entry, self.metadata_name)):
+
+            os.utime(entry)
+            return venv_class(venv_path)
+
+        if not os.path.isdir(self.path):
+
+            os.makedirs(self.path)
+
+        # The prototype is built aside and renamed into place so that
+        # concurrent creators never see an incomplete one.
+        building = tempfile.mkdtemp(prefix=".building-", dir=self.path)
+        try:
+
+            prototype = venv_class(os.path.join(building, "venv"))
+            prototype.create(
+                python=python, system_site=system_site, always_copy=always_copy
+            )
+            prototype.relocate(venv_path)
+            size = 0
+            for _, _, files in base.VenvDir(building).walk():
+
+                for file_ in files:
+
+                    size += os.lstat(file_.path).st_size
+
+            with open(os.path.join(building, self.metadata_name), "w") as metadata:
+
+                json.dump({"size": size}, metadata)
+
+            try:
+
+                os.rename(building, entry)
+
+            except OSError:
+
+                # Another process finished the same prototype first.
+                if not os.path.isdir(entry):
+
+                    raise
+
+        finally:
+
+            shutil.rmtree(building, ignore_errors=True)
+
+        self.evict(keep=entry)
+        return venv_class(venv_path)
+
+    def clone(self, venv, python=None, system_site=False, always_copy=False):
+        """Create a virtual environment by cloning the matching prototype.
+
+        Args:
+            venv (VirtualEnvironment): The virtual environment to create. Its
+                path must not exist.
+            python (str): The name or path of a python interpreter.
+            system_site (bool): Whether or not to use the system site packages.
+            always_copy (bool): Whether or not to copy instead of symlinking.
+
+        Returns:
+            VirtualEnvironment: The created virtual environment.
+        """
+        prototype = self.prototype(type(venv), python, system_site, always_copy)
+        # Like virtualenv, create any missing parents of the new path.
+        parent = os.path.dirname(venv.abspath)
+        if not os.path.isdir(parent):
+
+            os.makedirs(parent)
+
+        prototype.copy(venv.abspath, link=True)
+        return venv
+
+
+class CreateMixin(object):
+
+    """Can create new virtual environments.
+
+    This mixin requires the command mixin. Creating from a prototype cache
+    also requires the relocate mixin.
+    """
+
+    def create(
+        self, python=None, system_site=False, always_copy=False, cache=None
+    ):
+        """Create a new virtual environment.
+
+        Args:
+            python (str): The name or path of a python interpreter to use while
+                creating the virtual environment.
+            system_site (bool): Whether or not use use the system site packages
+                within the virtual environment. Default is False.
+            always_copy (bool): Whether or not to force copying instead of
+                symlinking in the virtual environment. Default is False.
+            cache (PrototypeCache): A cache of prototypes to clone the virtual
+                environment from instead of running virtualenv. It is only
+                used when the path does not exist yet. Default is None.
+        """
+        if cache is not None and not os.path.lexists(self.path):
+
+            cache.clone(self, python, system_site, always_copy)
+            return None
+
+        command = "virtualenv"
+        if python:
+
+            command = "{0} --python={1}".format(command, python)
+
+        if system_site:
+
+            command = "{0} --system-site-packages".format(command)
+
+        if always_copy:
+
+            command = "{0} --always-copy".format(command)
+
+        command = "{0} {1}".format(command, self.path)
+        self._execute(command)
@@ -0,0 +1,192 @@
+"""Virtual environment pip mixin."""
+
+from __future__ import division
+from __future__ import absolute_import
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import os
+import re
+
+
+def _normalize(name):
+    """Normalize a distribution name as described by PEP 503."""
+    return re.sub(r"[-_.]+", "-", name).lower()
+
+
+def _read_metadata(path):
+    """Get the name and version from a distribution metadata file.
+
+    Only the headers at the top of the file are read.
+
+    Args:
+        path (str): The path to a METADATA or PKG-INFO file.
+
+    Returns:
+        tuple: The name and version. Either is None if not present.
+    """
+    name = None
+    version = None
+    with open(path, "r", encoding="utf8", errors="replace") as file_handle:
+
+        for line in file_handle:
+
+            if not line.strip() or (name and version):
+
+                break
+
+            key, _, value = line.partition(":")
+            key = key.strip().lower()
+            if key == "name":
+
+                name = value.strip()
+
+            elif key == "version":
+
+                version = value.strip()
+
+    return name, version
+
+
+class PipMixin(object):
+
+    """Perform pip operations within a virtual environment.
+
+    This mixin depends on the command mixin.
+
+    Package lookups are answered from the distribution metadata found in the
+    site-packages directories without running pip. The results are cached
+    until the modification time of a site-packages directory changes.
+    """
+
+    def _package_index(self):
+        """Get a mapping of normalized distribution name to version."""
+        site_packages = list(self.site_packages)
+        key = tuple(
+            (path.path, os.stat(path.path).st_mtime_ns)
+            for path in site_packages
+        )
+        cached = getattr(self, "_packages", None)
+        if cached is not None and cached[0] == key:
+
+            return cached[1]
+
+        index = {}
+        for site in site_packages:
+
+            for path in site.paths:
+
+                if path.name.endswith(".dist-info"):
+
+                    metadata = os.path.join(path.path, "METADATA")
+
+                elif path.name.endswith(".egg-info"):
+
+                    metadata = path.path
+                    if path.is_dir:
+
+                        metadata = os.path.join(path.path, "PKG-INFO")
+
+                else:
+
+                    continue
+
+                try:
+
+                    name, version = _read_metadata(metadata)
+
+                except OSError:
+
+                    continue
+
+                if name:
+
+                    index.setdefault(_normalize(name), version)
+
+        self._packages = (key, index)
+        return index
+
+    def installed_versions(self):
+        """Get the versions of every installed distribution.
+
+        Returns:
+            dict: A mapping of normalized distribution name to version.
+        """
+        return dict(self._package_index())
+
+    def has_packages(self, names):
+        """Determine which of the given packages are installed.
+
+        Names are compared after normalization so "Foo_Bar" matches an
+        installed "foo-bar" but "foo" does not match "foobar".
+
+        Args:
+            names (iter of str): The package names to find.
+
+        Returns:
+            dict: A mapping of each given name to True if installed else
+            False.
+        """
+        index = self._package_index()
+        return dict((name, _normalize(name) in index) for name in names)
+
+    def has_package(self, name):
+        """Determine if the given package is installed.
+
+        Args:
+            name (str): The package name to find.
+
+        Returns:
+            bool: True if installed else false.
+        """
+        return self.has_packages((name,))[name]
+
+    def install_package(self, name, index=None, force=False, update=False):
+        """Install a given package.
+
+        Args:
+            name (str): The package name to install. This can be any valid
+                pip package specification.
+            index (str): The URL for a pypi index to use.
+            force (bool): For the reinstall of packages during updates.
+            update (bool): Update the package if it is out of date.
+        """
+        cmd = "install"
+        if force:
+
+            cmd = "{0} {1}".format(cmd, "--force-reinstall")
+
+        if update:
+
+            cmd = "{0} {1}".format(cmd, "--update")
+
+        if index:
+
+            cmd = "{0} {1}".format(cmd, "--index-url {0}".format(index))
+
+        self.pip("{0} {1}".format(cmd, name))
+        self._packages = None
+
+    def install_requirements(self, path, index=None):
+        """Install packages from a requirements.txt file.
+
+        Args:
+            path (str): The path to the requirements file.
+            index (str): The URL for a pypi index to use.
+        """
+        cmd = "install -r {0}".format(path)
+        if index:
+
+            cmd = "install --index-url {0} -r {1}".format(index, path)
+
+        self.pip(cmd)
+        self._packages = None
+
+    def uninstall_package(self, name):
+        """Uninstall a given package.
+
+        Args:
+            name (str): The name of the package to uninstall.
+        """
+        self.pip("{0} --yes {1}".format("uninstall", name))
+        self._packages = None
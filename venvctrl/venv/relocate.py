@@ -0,0 +1,1675 @@
+"""Virtual environment relocatable mixin."""
+
+from __future__ import division
+from __future__ import absolute_import
+from __future__ import print_function
+from __future__ import unicode_literals
+
+from concurrent import futures
+import errno
+import functools
+import io
+import itertools
+import mmap
+import os
+import re
+import shutil
+import stat
+import sys
+import tarfile
+import threading
+import time
+
+from . import base
+
+try:
+
+    import fcntl
+
+except ImportError:
+
+    fcntl = None
+
+
+# Files at least this large are memory mapped rather than read when scanned.
+_MMAP_SIZE = 64 * 1024
+# The number of leading bytes searched for a NUL to recognise binary files.
+_SNIFF_SIZE = 8 * 1024
+# The number of tasks each worker takes at a time. Most files are small, so
+# handing them out one by one would cost more than the work itself.
+_CHUNK_SIZE = 64
+# Errors which mean that a zero-copy system call cannot be used for a file.
+_NO_ZERO_COPY = frozenset(
+    (
+        errno.EXDEV,
+        errno.ENOSYS,
+        errno.EINVAL,
+        errno.ENOTSUP,
+        errno.EOPNOTSUPP,
+        errno.ENOTSOCK,
+    )
+)
+# The ioctl which shares the data of one file with another on file systems
+# that support reflinks, such as btrfs and xfs.
+_FICLONE = getattr(
+    fcntl,
+    "FICLONE",
+    0x40049409 if sys.platform.startswith("linux") else None,
+)
+# Errors which mean that a file system cannot reflink files at all.
+_NO_REFLINK = _NO_ZERO_COPY | frozenset((errno.ENOTTY,))
+
+
+class RelocateError(Exception):
+
+    """One or more files could not be relocated.
+
+    Attributes:
+        errors (dict): A mapping of file path to the exception raised while
+            relocating that file.
+    """
+
+    def __init__(self, errors):
+        """Initialize the error with the per-file exceptions."""
+        self.errors = errors
+        super(RelocateError, self).__init__(
+            "Could not relocate {0} file(s): {1}".format(
+                len(errors), ", ".join(sorted(errors))
+            )
+        )
+
+
+class RelocateStats(object):
+
+    """Timings and counts gathered while relocating a virtual environment.
+
+    The "walk" phase lists /bin and walks the tree to find the files that
+    need work. The "activates", "bin" for the other scripts, "pth", and
+    "scan" for the files found by a full scan phases work out the new
+    contents of each kind of file. The "write" phase then writes every
+    changed file. Copies have a "copy" phase for files copied without a
+    rewrite. The seconds of the per file phases are summed across workers
+    so they may add up to more than the elapsed time.
+
+    Attributes:
+        phases (dict): A mapping of phase name to a dict of the "count" of
+            files handled, or directories listed for the walk, and the
+            "seconds" spent.
+        files_scanned (int): The files read to look for the path.
+        files_rewritten (int): The files written with a new path.
+        files_copied (int): The files copied without a rewrite.
+        files_linked (int): The files that share data with the original.
+        bytes_read (int): The bytes read from scanned files.
+        bytes_written (int): The bytes written to rewritten files.
+        bytes_copied (int): The bytes of files copied without a rewrite.
+        elapsed (float): The seconds from start to finish.
+    """
+
+    phase_names = (
+        "walk", "activates", "bin", "pth", "scan", "write", "copy"
+    )
+    counter_names = (
+        "files_scanned",
+        "files_rewritten",
+        "files_copied",
+        "files_linked",
+        "bytes_read",
+        "bytes_written",
+        "bytes_copied",
+    )
+
+    def __init__(self):
+        """Initialize every timing and count to zero."""
+        self.phases = dict(
+            (name, {"count": 0, "seconds": 0.0}) for name in self.phase_names
+        )
+        for name in self.counter_names:
+
+            setattr(self, name, 0)
+
+        self.elapsed = 0.0
+        self._lock = threading.Lock()
+
+    def add(self, phase=None, count=0, seconds=0.0, **counters):
+        """Add to the timings and counts. This is safe to call from workers.
+
+        Args:
+            phase (str): The phase to add the count and seconds to, if any.
+            count (int): The files or directories handled within the phase.
+            seconds (float): The time spent within the phase.
+            **counters: Amounts to add to the named attributes.
+        """
+        with self._lock:
+
+            if phase is not None:
+
+                self.phases[phase]["count"] += count
+                self.phases[phase]["seconds"] += seconds
+
+            for name, amount in counters.items():
+
+                setattr(self, name, getattr(self, name) + amount)
+
+    def as_dict(self):
+        """Get the timings and counts as plain data, such as for JSON."""
+        stats = dict((name, getattr(self, name)) for name in self.counter_names)
+        stats["phases"] = dict(
+            (name, dict(phase)) for name, phase in self.phases.items()
+        )
+        stats["elapsed"] = self.elapsed
+        return stats
+
+    def __str__(self):
+        """Get the timings and counts as a table."""
+        lines = ["{0:<10} {1:>8} {2:>10}".format("phase", "count", "seconds")]
+        for name in self.phase_names:
+
+            phase = self.phases[name]
+            lines.append(
+                "{0:<10} {1:>8} {2:>10.4f}".format(
+                    name, phase["count"], phase["seconds"]
+                )
+            )
+
+        for name in self.counter_names:
+
+            lines.append(
+                "{0}: {1}".format(name.replace("_", " "), getattr(self, name))
+            )
+
+        lines.append("elapsed: {0:.4f}s".format(self.elapsed))
+        return "\n".join(lines)
+
+
+def _is_bytecode_cache(venv_dir):
+    """Get if a directory only holds compiled bytecode."""
+    return venv_dir.name == "__pycache__"
+
+
+def _relocate_shebang(shebang, destination):
+    """Get a python shebang rewritten for a new virtual environment path.
+
+    Args:
+        shebang (str): The current shebang of a script.
+        destination (str): The target path of the virtual environment.
+
+    Returns:
+        str: The new shebang or None if the script does not run python.
+    """
+    shebang = shebang.strip().split(os.linesep)
+    if len(shebang) == 1 and ("python" in shebang[0] or "pypy" in shebang[0]):
+
+        return "#!{0}".format(os.path.join(destination, "bin", "python"))
+
+    if len(shebang) == 3 and ("python" in shebang[1] or "pypy" in shebang[1]):
+
+        shebang[1] = "'''exec' {0} \"$0\" \"$@\"".format(
+            os.path.join(destination, "bin", "python")
+        )
+        return os.linesep.join(shebang)
+
+    return None
+
+
+def _find_all(content, value, end=None):
+    """Get the offset of every occurrence of value within content."""
+    offsets = []
+    offset = content.find(value, 0, end)
+    while offset >= 0:
+
+        offsets.append(offset)
+        offset = content.find(value, offset + len(value), end)
+
+    return offsets
+
+
+def _path_pattern(paths):
+    """Get a pattern matching any of the given paths as a whole path.
+
+    A match must not be followed by a character that would extend the final
+    path component so that /tmp/venv does not match within /tmp/venv2.
+    """
+    paths = sorted(set(paths), key=len, reverse=True)
+    return re.compile(
+        b"(?:"
+        + b"|".join(re.escape(path.encode("utf8")) for path in paths)
+        + b")(?![\\w.-])"
+    )
+
+
+def _scan_content(file_, relocation):
+    """Read a text file if it contains any of the old paths.
+
+    Files that contain a NUL byte near the start are taken to be binary and
+    are skipped. Large files are memory mapped so that files without a match
+    are searched without being copied into memory.
+
+    Args:
+        file_ (VenvFile): The file to search.
+        relocation (_Relocation): The relocation in progress.
+
+    Returns:
+        bytes: The contents of the file or None if there is no match.
+    """
+    with open(file_.path, "rb") as file_handle:
+
+        size = os.fstat(file_handle.fileno()).st_size
+        relocation.stats.add(files_scanned=1, bytes_read=size)
+        if size < _MMAP_SIZE:
+
+            content = file_handle.read()
+            if (
+                b"\0" in content[:_SNIFF_SIZE]
+                or not relocation.pattern.search(content)
+            ):
+
+                return None
+
+            return content
+
+        with mmap.mmap(
+            file_handle.fileno(), 0, access=mmap.ACCESS_READ
+        ) as mapped:
+
+            if (
+                mapped.find(b"\0", 0, _SNIFF_SIZE) >= 0
+                or not relocation.pattern.search(mapped)
+            ):
+
+                return None
+
+            return mapped[:]
+
+
+def _finish(relocation, original, content, scan, end=None):
+    """Apply the full scan rewrite and locate the destination.
+
+    Args:
+        relocation (_Relocation): The relocation in progress.
+        original (bytes): The contents of the file as read.
+        content (bytes): The contents with any targeted rewrites applied.
+        scan (bool): Whether or not to replace the old paths everywhere.
+        end (int): Only report offsets of the destination before this.
+
+    Returns:
+        tuple: The original contents, the new contents, and the offsets of
+        the destination within the new contents.
+    """
+    destination = relocation.destination.encode("utf8")
+    if scan:
+
+        content = relocation.pattern.sub(lambda _: destination, content)
+        return original, content, [
+            match.start()
+            for match in relocation.destination_pattern.finditer(content)
+        ]
+
+    return original, content, _find_all(content, destination, end)
+
+
+def _scan_finish(file_, relocation):
+    """Get the rewritten contents of a file found by the full scan."""
+    original = _scan_content(file_, relocation)
+    if original is None:
+
+        return None
+
+    return _finish(relocation, original, original, True)
+
+
+def _relocate_content(file_, relocation, activates, shebang, pth, scan):
+    """Get the contents of a file with the virtual environment relocated.
+
+    The file is read at most once.
+
+    Args:
+        file_ (VenvFile): The file to rewrite.
+        relocation (_Relocation): The relocation in progress.
+        activates (tuple): The ActivateFiles that describe the file if it is
+            an activate script.
+        shebang (bool): Whether the file may be a script with a shebang.
+        pth (bool): Whether the file is a .pth file.
+        scan (bool): Whether or not to replace the old paths everywhere
+            within the file.
+
+    Returns:
+        tuple: See `_finish`. None if the file is left as it is.
+    """
+    destination = relocation.destination
+    if activates or pth:
+
+        original = file_.read()
+
+    elif shebang:
+
+        original = file_._read_script()
+        if original is None:
+
+            if not scan or file_.is_link:
+
+                return None
+
+            return _scan_finish(file_, relocation)
+
+    else:
+
+        return _scan_finish(file_, relocation)
+
+    relocation.stats.add(files_scanned=1, bytes_read=len(original))
+    content = original
+    for activate in activates:
+
+        content = activate._rewrite_vpath(content, destination)
+
+    if shebang:
+
+        content = file_._rewrite_shebang(
+            content,
+            functools.partial(_relocate_shebang, destination=destination),
+        ) or content
+
+    if pth:
+
+        # It's not certain whether the .pth will have a relative
+        # or absolute path so we replace both in order of most to
+        # least specific.
+        text = content.decode("utf8")
+        for old_path in relocation.old_paths:
+
+            text = text.replace(old_path, destination)
+
+        content = text.encode("utf8")
+
+    end = None if activates or pth else base._shebang_end(content)
+    return _finish(relocation, original, content, scan, end)
+
+
+def _splice_content(file_, relocation, offsets):
+    """Replace the path at known offsets within the contents of a file.
+
+    Args:
+        file_ (VenvFile): The file to rewrite.
+        relocation (_Relocation): The relocation in progress.
+        offsets (list): The offsets of the path the file was last relocated
+            to within the file.
+
+    Returns:
+        tuple: See `_finish`. None if the old path is not found at every
+        offset.
+    """
+    original = file_.read()
+    relocation.stats.add(files_scanned=1, bytes_read=len(original))
+    old = relocation.old_vpath.encode("utf8")
+    new = relocation.destination.encode("utf8")
+    pieces = []
+    start = 0
+    for offset in offsets:
+
+        if original[offset:offset + len(old)] != old:
+
+            return None
+
+        pieces.append(original[start:offset])
+        pieces.append(new)
+        start = offset + len(old)
+
+    pieces.append(original[start:])
+    shift = len(new) - len(old)
+    return original, b"".join(pieces), [
+        offset + count * shift for count, offset in enumerate(offsets)
+    ]
+
+
+class _Rewrite(object):
+
+    """The new contents of a single file, worked out before any is written.
+
+    Attributes:
+        file (VenvFile): The file to rewrite.
+        original (bytes): The contents of the file as read, if it was.
+        content (bytes): The new contents of the file, if it was read.
+        offsets (list): The offsets at which the destination is written.
+        rewrites (list): The names of the rewrites that apply to the file.
+        staged (str): The temporary file holding the new contents, if any.
+    """
+
+    def __init__(self, file_, original, content, offsets, rewrites):
+        """Initialize the rewrite."""
+        self.file = file_
+        self.original = original
+        self.content = content
+        self.offsets = offsets
+        self.rewrites = rewrites
+        self.staged = None
+
+    @property
+    def changed(self):
+        """Get if the file must be written."""
+        return self.content is not None and self.content != self.original
+
+    @property
+    def key(self):
+        """Get the path of the underlying file, which links may share."""
+        return self.file.realpath if self.file.is_link else self.file.abspath
+
+    def stage(self):
+        """Write the new contents to a temporary file beside the file."""
+        self.staged = base._stage(self.file.realpath, self.content)
+
+    def commit(self):
+        """Replace the file with its staged contents."""
+        os.replace(self.staged, self.file.realpath)
+        self.staged = None
+
+    def discard(self):
+        """Remove the staged contents if they were never committed."""
+        if self.staged is not None:
+
+            try:
+
+                os.unlink(self.staged)
+
+            except OSError:
+
+                pass
+
+            self.staged = None
+
+    def record(self):
+        """Get the manifest entry for the file once it is written."""
+        stat = os.stat(self.file.path)
+        return {
+            "size": stat.st_size,
+            "mtime": stat.st_mtime_ns,
+            "offsets": self.offsets,
+            "rewrites": self.rewrites,
+        }
+
+
+def _relocate_one(file_, relocation, activates, shebang, pth, scan, record=None):
+    """Work out the relocated contents of a single file without writing it.
+
+    The file is read at most once. See `_relocate_content` for the rewrite
+    arguments.
+
+    Args:
+        record (dict): The manifest entry for the file if it is unchanged
+            since the last relocation.
+
+    Returns:
+        _Rewrite: The new contents of the file.
+    """
+    result = None
+    if record is not None:
+
+        result = _splice_content(file_, relocation, record["offsets"])
+
+    if result is None:
+
+        result = _relocate_content(
+            file_, relocation, activates, shebang, pth, scan
+        )
+
+    original, content, offsets = result or (None, None, [])
+    return _Rewrite(
+        file_,
+        original,
+        content,
+        offsets,
+        [
+            name
+            for name, enabled in (
+                ("activate", activates),
+                ("shebang", shebang),
+                ("pth", pth),
+                ("scan", scan),
+            )
+            if enabled
+        ],
+    )
+
+
+def _apply(rewrites, workers, stats):
+    """Write every changed file.
+
+    The new contents of each file are first staged in a temporary file
+    beside it. Only once all of them are staged do they replace the
+    originals, which are then only renames. The renames are not all or
+    nothing: if one fails, the files renamed before it keep their new
+    contents and the rest keep their old ones.
+
+    Args:
+        rewrites (iter): The _Rewrite of every file.
+        workers (int): The number of threads used to stage files.
+        stats (RelocateStats): The timings and counts to add to.
+
+    Raises:
+        RelocateError: If any file could not be staged or replaced. No file
+            is changed when staging fails. When replacing fails, some files
+            may already have been replaced.
+    """
+    start = time.perf_counter()
+    pending = {}
+    for rewrite in rewrites:
+
+        # A file reached through several links is only written once.
+        if rewrite.changed:
+
+            pending.setdefault(rewrite.key, rewrite)
+
+    try:
+
+        errors, _ = _run_tasks(
+            (
+                (rewrite.file.path, None, rewrite.stage)
+                for rewrite in pending.values()
+            ),
+            workers,
+        )
+        if errors:
+
+            raise RelocateError(errors)
+
+        for rewrite in pending.values():
+
+            try:
+
+                rewrite.commit()
+
+            except OSError as exc:
+
+                raise RelocateError({rewrite.file.path: exc})
+
+            stats.add(files_rewritten=1, bytes_written=len(rewrite.content))
+
+    finally:
+
+        for rewrite in pending.values():
+
+            rewrite.discard()
+
+    stats.add("write", len(pending), time.perf_counter() - start)
+
+
+def _copy_range(source, target, offset, count):
+    """Copy part of a file with copy_file_range."""
+    return os.copy_file_range(source, target, count, offset, offset)
+
+
+def _send(source, target, offset, count):
+    """Copy part of a file with sendfile."""
+    return os.sendfile(target, source, offset, count)
+
+
+_ZERO_COPY = tuple(
+    method
+    for name, method in (
+        ("copy_file_range", _copy_range),
+        ("sendfile", _send),
+    )
+    if hasattr(os, name)
+)
+
+
+def _copy_data(source, target, size):
+    """Copy the contents of one file descriptor into another.
+
+    The data is copied within the kernel using copy_file_range or sendfile
+    when the platform and file systems allow it. Otherwise this falls back to
+    a buffered copy. Some file systems report that nothing was copied rather
+    than failing, and the source may shrink while it is copied, so a copy
+    that stops short also falls back instead of leaving a truncated file.
+    """
+    for method in _ZERO_COPY:
+
+        offset = 0
+        try:
+
+            while offset < size:
+
+                copied = method(source, target, offset, size - offset)
+                if not copied:
+
+                    break
+
+                offset += copied
+
+        except OSError as exc:
+
+            if exc.errno not in _NO_ZERO_COPY:
+
+                raise
+
+        else:
+
+            if offset == size:
+
+                return None
+
+        # Start over with the next method from an empty target.
+        os.ftruncate(target, 0)
+        os.lseek(target, 0, os.SEEK_SET)
+
+    os.lseek(source, 0, os.SEEK_SET)
+    with open(source, "rb", closefd=False) as source_handle:
+
+        with open(target, "wb", closefd=False) as target_handle:
+
+            shutil.copyfileobj(source_handle, target_handle)
+
+    return None
+
+
+def _copy_one(file_, relocation, target, rewrites):
+    """Copy a single file to a new path, relocating it on the way.
+
+    The mode of the file is kept. So is the modification time unless the
+    contents changed, which keeps bytecode caches valid in the copy.
+
+    Args:
+        file_ (VenvFile): The file to copy.
+        relocation (_Relocation): The relocation in progress.
+        target (str): The path of the copy.
+        rewrites (tuple): The activates, shebang, pth, and scan arguments
+            for `_relocate_content`.
+    """
+    result = None
+    if any(rewrites):
+
+        result = _relocate_content(file_, relocation, *rewrites)
+
+    if result is None and relocation.link and _link_one(
+        file_, relocation, target
+    ):
+
+        relocation.stats.add(files_linked=1)
+        return None
+
+    with open(file_.path, "rb") as source:
+
+        source_stat = os.fstat(source.fileno())
+        descriptor = os.open(
+            target, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600
+        )
+        with os.fdopen(descriptor, "wb") as target_handle:
+
+            if result is None:
+
+                _copy_data(
+                    source.fileno(),
+                    target_handle.fileno(),
+                    source_stat.st_size,
+                )
+
+            else:
+
+                target_handle.write(result[1])
+
+    if result is None or result[0] == result[1]:
+
+        relocation.stats.add(files_copied=1, bytes_copied=source_stat.st_size)
+
+    else:
+
+        relocation.stats.add(files_rewritten=1, bytes_written=len(result[1]))
+
+    os.chmod(target, stat.S_IMODE(source_stat.st_mode))
+    if result is None or result[0] == result[1]:
+
+        os.utime(
+            target, ns=(source_stat.st_atime_ns, source_stat.st_mtime_ns)
+        )
+
+
+def _link_one(file_, relocation, target):
+    """Share the data of a file with a new path instead of copying it.
+
+    A reflink is tried first because the copy may then be changed without
+    affecting the original. Once the file system turns out not to support
+    them, hard links are made instead.
+
+    Args:
+        file_ (VenvFile): The file to share.
+        relocation (_Relocation): The relocation in progress.
+        target (str): The path of the copy.
+
+    Returns:
+        bool: Whether or not the file was shared. When False, the target
+        does not exist and the file must be copied.
+    """
+    if relocation.reflink and _FICLONE is not None:
+
+        with open(file_.path, "rb") as source:
+
+            source_stat = os.fstat(source.fileno())
+            descriptor = os.open(
+                target, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600
+            )
+            try:
+
+                fcntl.ioctl(descriptor, _FICLONE, source.fileno())
+                cloned = True
+
+            except OSError as exc:
+
+                if exc.errno in _NO_REFLINK:
+
+                    relocation.reflink = False
+
+                cloned = False
+
+            finally:
+
+                os.close(descriptor)
+
+        if cloned:
+
+            os.chmod(target, stat.S_IMODE(source_stat.st_mode))
+            os.utime(
+                target, ns=(source_stat.st_atime_ns, source_stat.st_mtime_ns)
+            )
+            return True
+
+        os.unlink(target)
+
+    try:
+
+        os.link(file_.path, target)
+
+    except OSError:
+
+        return False
+
+    return True
+
+
+def _same_file_system(source, destination):
+    """Get if a new path would be on the same file system as the source.
+
+    This is assumed to be True when the destination already exists or its
+    parent cannot be inspected so that shutil.move keeps its usual behavior.
+    """
+    if os.path.lexists(destination):
+
+        return True
+
+    parent = os.path.dirname(os.path.abspath(destination))
+    try:
+
+        return os.stat(source).st_dev == os.stat(parent).st_dev
+
+    except OSError:
+
+        return True
+
+
+def _phase(activates, shebang, pth, scan):
+    """Get the stats phase of a file from the rewrites that apply to it."""
+    for name, enabled in (
+        ("activates", activates),
+        ("bin", shebang),
+        ("pth", pth),
+        ("scan", scan),
+    ):
+
+        if enabled:
+
+            return name
+
+    return "copy"
+
+
+def _check_workers(workers):
+    """Raise a ValueError if the number of workers is invalid."""
+    if workers is not None and workers < 1:
+
+        raise ValueError("Workers must be a positive number.")
+
+
+def _task(phase, file_, func, *args):
+    """Bind a file operation into a task for the relocation runner.
+
+    Returns:
+        tuple: The file path, the stats phase to add the time of the
+        operation to, and a function that performs the operation.
+    """
+
+    def run():
+        return func(file_, *args)
+
+    return file_.path, phase, run
+
+
+def _run_chunk(tasks, stats=None):
+    """Run relocation tasks in turn on the calling thread.
+
+    The time of each task is summed by phase and added to the stats once all
+    of them have run.
+
+    Args:
+        tasks (iter): An iter of (path, phase, function) tuples. Tasks with
+            a phase of None are not timed.
+        stats (RelocateStats): The timings to add to, if any.
+
+    Returns:
+        tuple: A mapping of file path to the exception raised by its task and
+        a mapping of file path to the value returned by its task.
+    """
+    errors = {}
+    results = {}
+    timings = {}
+    for path, phase, run in tasks:
+
+        start = time.perf_counter()
+        try:
+
+            results[path] = run()
+
+        except Exception as exc:
+
+            errors[path] = exc
+
+        if phase is not None:
+
+            timing = timings.setdefault(phase, [0, 0.0])
+            timing[0] += 1
+            timing[1] += time.perf_counter() - start
+
+    if stats is not None:
+
+        for phase, (count, seconds) in timings.items():
+
+            stats.add(phase, count, seconds)
+
+    return errors, results
+
+
+def _run_tasks(tasks, workers=None, stats=None):
+    """Run relocation tasks, collecting the results and errors by file path.
+
+    Args:
+        tasks (iter): An iter of (path, phase, function) tuples. The iter is
+            consumed as tasks are submitted so discovery overlaps with the
+            work.
+        workers (int): The number of threads to use. The tasks run on the
+            calling thread if this is None or 1. Otherwise each thread takes
+            a chunk of tasks at a time.
+        stats (RelocateStats): The timings to add to, if any.
+
+    Returns:
+        tuple: A mapping of file path to the exception raised by its task and
+        a mapping of file path to the value returned by its task.
+    """
+    if not workers or workers == 1:
+
+        return _run_chunk(tasks, stats)
+
+    errors = {}
+    results = {}
+    tasks = iter(tasks)
+    # Bound the number of queued chunks so that discovery only runs a little
+    # ahead of the workers.
+    slots = threading.BoundedSemaphore(workers * 2)
+    pending = []
+    with futures.ThreadPoolExecutor(max_workers=workers) as executor:
+
+        while True:
+
+            chunk = list(itertools.islice(tasks, _CHUNK_SIZE))
+            if not chunk:
+
+                break
+
+            slots.acquire()
+            future = executor.submit(_run_chunk, chunk, stats)
+            future.add_done_callback(lambda _: slots.release())
+            pending.append(future)
+
+    for future in pending:
+
+        chunk_errors, chunk_results = future.result()
+        errors.update(chunk_errors)
+        results.update(chunk_results)
+
+    return errors, results
+
+
+class _Relocation(object):
+
+    """The discovery state of a single call to relocate."""
+
+    def __init__(
+        self,
+        venv,
+        destination,
+        manifest=None,
+        record=False,
+        full_scan=False,
+        link=False,
+        stats=None,
+    ):
+        """Initialize the relocation.
+
+        Args:
+            venv (VirtualEnvironment): The virtual environment to relocate.
+            destination (str): The target path of the virtual environment.
+            manifest (dict): The contents of the manifest left by the last
+                relocation, if any.
+            record (bool): Whether or not to build a new manifest.
+            full_scan (bool): Whether or not to replace the old paths within
+                every text file rather than only the known locations.
+            link (bool): Whether or not copies share the data of files that
+                need no rewrite with the original.
+            stats (RelocateStats): The timings and counts to add to. A new
+                one is used if this is None.
+        """
+        self.venv = venv
+        self.bin = venv.bin
+        self.manifest_path = venv.manifest.path
+        self.destination = destination
+        self.manifest = manifest
+        self.record = record
+        self.full_scan = full_scan
+        self.link = link
+        self.reflink = link
+        self.stats = stats if stats is not None else RelocateStats()
+        self.old_vpath = manifest["vpath"] if manifest else None
+        old_paths = set((venv.abspath, venv.path))
+        if self.old_vpath:
+
+            old_paths.add(self.old_vpath)
+
+        self.old_paths = tuple(sorted(old_paths, key=len, reverse=True))
+        self.pattern = None
+        self.destination_pattern = None
+        if full_scan:
+
+            # Only absolute paths are searched for. A relative path such as
+            # "venv" would match far too much unrelated text.
+            self.pattern = _path_pattern(
+                path
+                for path in old_paths | set((venv.realpath,))
+                if os.path.isabs(path)
+            )
+            self.destination_pattern = _path_pattern((destination,))
+        self.absolute_paths = tuple(
+            sorted(set((venv.abspath, venv.realpath)), key=len, reverse=True)
+        )
+        self.dirs = []
+        self.files = {}
+        self.copied_dirs = []
+        self.activates = {}
+        for activate in self.bin.activates:
+
+            self.activates.setdefault(
+                self._relpath(activate.path), []
+            ).append(activate)
+
+    def _relpath(self, path):
+        """Get a path relative to the virtual environment."""
+        return os.path.relpath(path, self.venv.path)
+
+    def _discover(self, tasks, dirs):
+        """Add the time spent finding tasks, between runs, to the walk.
+
+        Args:
+            tasks (iter): The tasks to time the discovery of.
+            dirs (list): The directories listed, which is filled in as the
+                tasks are found.
+        """
+        seconds = 0.0
+        tasks = iter(tasks)
+        while True:
+
+            start = time.perf_counter()
+            task = next(tasks, None)
+            seconds += time.perf_counter() - start
+            if task is None:
+
+                break
+
+            yield task
+
+        self.stats.add("walk", len(dirs), seconds)
+
+    def _bin_task(self, binfile, record=None):
+        """Get the task that relocates a file in /bin."""
+        activates = tuple(self.activates.get(self._relpath(binfile.path), ()))
+        return _task(
+            "activates" if activates else "bin",
+            binfile,
+            _relocate_one,
+            self,
+            activates,
+            True,
+            binfile.path.endswith(".pth"),
+            self.full_scan,
+            record,
+        )
+
+    def _pth_task(self, pthfile, record=None):
+        """Get the task that relocates a .pth file."""
+        return _task(
+            "pth",
+            pthfile,
+            _relocate_one,
+            self,
+            (),
+            False,
+            True,
+            self.full_scan,
+            record,
+        )
+
+    def _scan_task(self, file_, record=None):
+        """Get the task that relocates any other text file."""
+        return _task(
+            "scan", file_, _relocate_one, self, (), False, False, True, record
+        )
+
+    def _file_task(self, file_):
+        """Get the task for a file found outside of /bin, if it needs one."""
+        if file_.path == self.manifest_path:
+
+            return None
+
+        if file_.path.endswith(".pth"):
+
+            return self._pth_task(file_)
+
+        # Symbolic links are skipped so that files outside of the virtual
+        # environment, such as the system python, are never modified.
+        if self.full_scan and not file_.is_link:
+
+            return self._scan_task(file_)
+
+        return None
+
+    def _walk_tasks(self, venv_dir):
+        """Get the tasks for every .pth file below a directory."""
+        # Even though wheel is the official format, there are still several
+        # cases in the wild where eggs are being installed. Eggs come with the
+        # possibility of .pth files. Each .pth file contains the path to where
+        # a module can be found. To handle them we must recurse the entire
+        # venv file tree since they can be either at the root of the
+        # site-packages, bundled within an egg directory, or both.
+        for current, _, files in venv_dir.walk(prune=_is_bytecode_cache):
+
+            self.dirs.append(self._relpath(current.path))
+            if self._relpath(current.path) == "bin":
+
+                continue
+
+            for file_ in files:
+
+                task = self._file_task(file_)
+                if task is not None:
+
+                    yield task
+
+    def tasks(self):
+        """Get an iter of tasks that each relocate a single file.
+
+        The manifest only vouches for the files its own relocation looked at.
+        A full scan after a relocation without one must walk the whole tree
+        even though the path of that relocation is still searched for.
+        """
+        if self.manifest and (
+            self.manifest.get("full_scan") or not self.full_scan
+        ):
+
+            start = time.perf_counter()
+            tasks = self._update_tasks()
+            self.stats.add(
+                "walk", len(self.dirs), time.perf_counter() - start
+            )
+            return iter(tasks)
+
+        return self._discover(self._scan_tasks(), self.dirs)
+
+    def _scan_tasks(self):
+        """Get the tasks for every file that may reference the venv path."""
+        # List /bin before any rewrite starts. Rewrites briefly place
+        # temporary files next to the originals which must not be picked up.
+        binfiles = list(self.bin.files)
+        for binfile in binfiles:
+
+            yield self._bin_task(binfile)
+
+        for task in self._walk_tasks(self.venv):
+
+            yield task
+
+    def _update_tasks(self):
+        """Get the tasks for the files that the manifest cannot vouch for.
+
+        Files recorded in the manifest with an unchanged size and mtime have
+        the path spliced at the recorded offsets. Directories with an
+        unchanged mtime have not gained any entries and so are not listed.
+
+        Returns:
+            list: The tasks. These are all gathered before any is run so
+            that temporary files from the rewrites are never picked up.
+        """
+        known_files = self.manifest["files"]
+        known_dirs = self.manifest["dirs"]
+        tasks = []
+        for relpath, mtime in known_dirs.items():
+
+            path = os.path.join(self.venv.path, relpath)
+            try:
+
+                stat = os.stat(path)
+
+            except OSError:
+
+                continue
+
+            self.dirs.append(relpath)
+            if stat.st_mtime_ns == mtime:
+
+                continue
+
+            venv_dir = self.bin if relpath == "bin" else base.VenvDir(path)
+            dirs, files = venv_dir._scan()
+            for file_ in files:
+
+                if self._relpath(file_.path) in known_files:
+
+                    continue
+
+                task = (
+                    self._bin_task(file_)
+                    if relpath == "bin"
+                    else self._file_task(file_)
+                )
+                if task is not None:
+
+                    tasks.append(task)
+
+            for dir_ in dirs:
+
+                if (
+                    self._relpath(dir_.path) in known_dirs
+                    or dir_.is_link
+                    or _is_bytecode_cache(dir_)
+                ):
+
+                    continue
+
+                tasks.extend(self._walk_tasks(dir_))
+
+        for relpath, record in known_files.items():
+
+            path = os.path.join(self.venv.path, relpath)
+            try:
+
+                stat = os.stat(path)
+
+            except OSError:
+
+                continue
+
+            unchanged = (
+                stat.st_size == record["size"]
+                and stat.st_mtime_ns == record["mtime"]
+            )
+            if unchanged and not record["offsets"]:
+
+                self.files[relpath] = record
+                continue
+
+            rewrites = record["rewrites"]
+            record = record if unchanged else None
+            if "shebang" in rewrites:
+
+                tasks.append(self._bin_task(base.BinFile(path), record))
+
+            elif "pth" in rewrites:
+
+                tasks.append(self._pth_task(base.VenvFile(path), record))
+
+            elif record is not None or self.full_scan:
+
+                tasks.append(self._scan_task(base.VenvFile(path), record))
+
+        return tasks
+
+    def _tree(self):
+        """Get an iter of every entry in the virtual environment.
+
+        Unlike the walk used for relocation, this includes every kind of
+        entry, such as broken symbolic links, and prunes nothing. The
+        relocation manifest is left out because it describes only this copy.
+
+        Yields:
+            tuple: The path relative to the virtual environment and the
+            os.DirEntry. Directories are yielded before their contents.
+        """
+        manifest_path = self.manifest_path
+        pending = [(self.venv.path, "")]
+        while pending:
+
+            path, relpath = pending.pop()
+            for entry in base._scandir(path):
+
+                if entry.path == manifest_path:
+
+                    continue
+
+                entry_relpath = os.path.join(relpath, entry.name)
+                yield entry_relpath, entry
+                if not entry.is_symlink() and base._entry_check(entry.is_dir):
+
+                    pending.append((entry.path, entry_relpath))
+
+    def _plan(self, relpath, entry):
+        """Get the rewrites that apply to a file found by `_tree`.
+
+        Returns:
+            tuple: The VenvFile and a tuple of the activates, shebang, pth,
+            and scan arguments for `_relocate_content`.
+        """
+        pth = entry.name.endswith(".pth")
+        if os.path.dirname(relpath) == "bin":
+
+            return base.BinFile(entry.path, entry), (
+                tuple(self.activates.get(relpath, ())),
+                True,
+                pth,
+                self.full_scan,
+            )
+
+        return base.VenvFile(entry.path, entry), ((), False, pth, self.full_scan)
+
+    def _link_target(self, path):
+        """Get the target for a copy of a symbolic link.
+
+        Absolute links into the virtual environment are pointed at the same
+        location within the destination.
+        """
+        link = os.readlink(path)
+        for old_path in self.absolute_paths:
+
+            if link == old_path or link.startswith(old_path + os.sep):
+
+                return self.destination + link[len(old_path):]
+
+        return link
+
+    def copy_tasks(self, target):
+        """Get the tasks that copy each file into an empty target directory.
+
+        Directories and symbolic links are created as the tree is listed. The
+        modes of the directories are only applied by `finish_copy` so that
+        read only directories can still be filled.
+        """
+        return self._discover(self._copy_tasks(target), self.copied_dirs)
+
+    def _copy_tasks(self, target):
+        """Get the tasks for `copy_tasks`."""
+        self.copied_dirs.append((target, os.stat(self.venv.path).st_mode))
+        for relpath, entry in self._tree():
+
+            path = os.path.join(target, relpath)
+            if entry.is_symlink():
+
+                os.symlink(self._link_target(entry.path), path)
+
+            elif base._entry_check(entry.is_dir):
+
+                os.mkdir(path, 0o700)
+                self.copied_dirs.append((path, entry.stat().st_mode))
+
+            elif base._entry_check(entry.is_file):
+
+                file_, rewrites = self._plan(relpath, entry)
+                yield _task(
+                    _phase(*rewrites), file_, _copy_one, self, path, rewrites
+                )
+
+    def finish_copy(self):
+        """Apply the original modes to the copied directories."""
+        for path, mode in reversed(self.copied_dirs):
+
+            os.chmod(path, stat.S_IMODE(mode))
+
+    def archive(self, archive, root):
+        """Add a relocated copy of every entry to a tar archive.
+
+        Args:
+            archive (tarfile.TarFile): The archive to add entries to.
+            root (str): The name of the top level directory in the archive.
+
+        Returns:
+            dict: A mapping of file path to the exception raised while adding
+            it to the archive.
+        """
+        errors = {}
+        archive.add(self.venv.path, arcname=root, recursive=False)
+        for relpath, entry in self._tree():
+
+            try:
+
+                info = archive.gettarinfo(
+                    entry.path, arcname=os.path.join(root, relpath)
+                )
+                if info is None:
+
+                    continue
+
+                if info.issym():
+
+                    info.linkname = self._link_target(entry.path)
+
+                if not info.isreg():
+
+                    archive.addfile(info)
+                    continue
+
+                file_, rewrites = self._plan(relpath, entry)
+                result = None
+                if any(rewrites):
+
+                    result = _relocate_content(file_, self, *rewrites)
+
+                if result is None or result[0] == result[1]:
+
+                    with open(entry.path, "rb") as source:
+
+                        archive.addfile(info, source)
+
+                    continue
+
+                info.size = len(result[1])
+                info.mtime = time.time()
+                archive.addfile(info, io.BytesIO(result[1]))
+
+            except Exception as exc:
+
+                errors[entry.path] = exc
+
+        return errors
+
+    def manifest_contents(self, results):
+        """Get the new manifest from the results of the relocation tasks."""
+        files = dict(self.files)
+        for path, rewrite in results.items():
+
+            files[self._relpath(path)] = rewrite.record()
+
+        dirs = {}
+        for relpath in self.dirs:
+
+            try:
+
+                dirs[relpath] = os.stat(
+                    os.path.join(self.venv.path, relpath)
+                ).st_mtime_ns
+
+            except OSError:
+
+                continue
+
+        return {
+            "vpath": self.destination,
+            "full_scan": self.full_scan,
+            "files": files,
+            "dirs": dirs,
+        }
+
+
+class RelocateMixin(object):
+
+    """Mixin which adds the ability to relocate a virtual environment."""
+
+    def relocate(
+        self,
+        destination,
+        workers=None,
+        manifest=False,
+        full_scan=False,
+        stats=None,
+    ):
+        """Configure the virtual environment for another path.
+
+        Args:
+            destination (str): The target path of the virtual environment.
+            workers (int): The number of threads used to find and rewrite
+                files. Default is None which rewrites each file in turn on
+                the calling thread.
+            manifest (bool): Whether or not to keep a manifest of where the
+                path appears within the virtual environment. When a manifest
+                from an earlier relocation is present, only the files and
+                directories that changed since are scanned. Relocating
+                without the manifest removes any existing one because it
+                would no longer be accurate. Default is False.
+            full_scan (bool): Whether or not to also replace the absolute
+                path of the virtual environment within every other text file,
+                such as pyvenv.cfg, RECORD, and direct_url.json files or
+                scripts for other interpreters. Binary files and symbolic
+                links are skipped. Default is False.
+            stats (RelocateStats): The timings and counts to add to. Default
+                is None which starts new ones.
+
+        Returns:
+            RelocateStats: The timings and counts of each phase of the
+            relocation.
+
+        Raises:
+            ValueError: If workers is less than 1.
+            RelocateError: If any file could not be relocated. The new
+                contents of every file are worked out and staged before any
+                is written so no file is changed in this case. The files are
+                then replaced one by one. If a replace fails, the files
+                replaced before it are already relocated and any manifest
+                has been removed.
+
+        Note:
+            This does not actually move the virtual environment. Is only
+            rewrites the metadata required to support a move.
+        """
+        _check_workers(workers)
+        start = time.perf_counter()
+        manifest_file = self.manifest
+        contents = manifest_file.contents if manifest else None
+        relocation = _Relocation(
+            self, destination, contents, manifest, full_scan, stats=stats
+        )
+        errors, results = _run_tasks(
+            relocation.tasks(), workers, relocation.stats
+        )
+        if errors:
+
+            raise RelocateError(errors)
+
+        # The manifest no longer describes the files once any is written.
+        manifest_file.remove()
+        _apply(results.values(), workers, relocation.stats)
+        if manifest:
+
+            manifest_file.contents = relocation.manifest_contents(results)
+
+        relocation.stats.add(elapsed=time.perf_counter() - start)
+        return relocation.stats
+
+    def move(
+        self,
+        destination,
+        workers=None,
+        manifest=False,
+        full_scan=False,
+        stats=None,
+    ):
+        """Reconfigure and move the virtual environment to another path.
+
+        Within a file system the files are relocated in place and then the
+        directory is renamed. Across file systems the virtual environment is
+        streamed to the destination with `copy` and the original is removed
+        only once the copy is complete.
+
+        Args:
+            destination (str): The target path of the virtual environment.
+            workers (int): The number of threads used while relocating. See
+                `relocate` for details.
+            manifest (bool): Whether or not to keep a relocation manifest.
+                See `relocate` for details.
+            full_scan (bool): Whether or not to rewrite the path within every
+                text file. See `relocate` for details.
+            stats (RelocateStats): The timings and counts to add to. Default
+                is None which starts new ones.
+
+        Returns:
+            RelocateStats: The timings and counts of the relocation or copy.
+
+        Raises:
+            RelocateError: If any file could not be relocated. The virtual
+                environment is not moved in this case.
+
+        Note:
+            Unlike `relocate`, this method *will* move the virtual to the
+            given path.
+        """
+        stats = stats if stats is not None else RelocateStats()
+        if not _same_file_system(self.path, destination):
+
+            self.copy(
+                destination,
+                workers=workers,
+                manifest=manifest,
+                full_scan=full_scan,
+                stats=stats,
+            )
+            shutil.rmtree(self.path)
+            self._path = destination
+            return stats
+
+        self.relocate(
+            destination,
+            workers=workers,
+            manifest=manifest,
+            full_scan=full_scan,
+            stats=stats,
+        )
+        shutil.move(self.path, destination)
+        self._path = destination
+        return stats
+
+    def copy(
+        self,
+        destination,
+        workers=None,
+        manifest=False,
+        full_scan=False,
+        link=False,
+        stats=None,
+    ):
+        """Copy the virtual environment to another path and relocate the copy.
+
+        Each file is read once and written once. Files that need a new path
+        are rewritten as they are copied while every other file is copied
+        with copy_file_range or sendfile where the kernel supports it. This
+        virtual environment is left unchanged.
+
+        Args:
+            destination (str): The path of the copy. It must not exist.
+            workers (int): The number of threads used to copy files. See
+                `relocate` for details.
+            manifest (bool): Whether or not to record a relocation manifest
+                in the copy. See `relocate` for details.
+            full_scan (bool): Whether or not to rewrite the path within every
+                text file. See `relocate` for details.
+            link (bool): Whether or not files that need no rewrite share their
+                data with this virtual environment rather than being copied.
+                Reflinks are used where the file system supports them and
+                hard links otherwise. Hard linked files must not be modified
+                in place. Default is False.
+            stats (RelocateStats): The timings and counts to add to. Default
+                is None which does not keep them.
+
+        Returns:
+            VirtualEnvironment: The copy.
+
+        Raises:
+            OSError: If the destination already exists.
+            ValueError: If workers is less than 1.
+            RelocateError: If any file could not be copied. The partial copy
+                is removed in this case.
+        """
+        _check_workers(workers)
+        start = time.perf_counter()
+        relocation = _Relocation(
+            self, destination, full_scan=full_scan, link=link, stats=stats
+        )
+        os.mkdir(destination, 0o700)
+        try:
+
+            errors, _ = _run_tasks(
+                relocation.copy_tasks(destination), workers, relocation.stats
+            )
+            if errors:
+
+                raise RelocateError(errors)
+
+            relocation.finish_copy()
+
+        except BaseException:
+
+            shutil.rmtree(destination, ignore_errors=True)
+            raise
+
+        relocation.stats.add(elapsed=time.perf_counter() - start)
+        copied = type(self)(destination)
+        if manifest:
+
+            copied.relocate(
+                destination,
+                workers=workers,
+                manifest=True,
+                full_scan=full_scan,
+                stats=stats,
+            )
+
+        return copied
+
+    def archive(self, path, destination, compression=None, full_scan=False):
+        """Write a relocated copy of the virtual environment to a tar archive.
+
+        The entries are named after the destination without its leading
+        slash so that extracting the archive from the root of the file system
+        places the virtual environment at the destination. No intermediate
+        copy is made and this virtual environment is left unchanged.
+
+        Args:
+            path (str): The path of the archive to create.
+            destination (str): The target path of the virtual environment.
+            compression (str): One of "gz", "bz2", or "xz" to compress the
+                archive. Default is None.
+            full_scan (bool): Whether or not to rewrite the path within every
+                text file. See `relocate` for details.
+
+        Raises:
+            RelocateError: If any file could not be added. The archive is
+                removed in this case.
+        """
+        relocation = _Relocation(self, destination, full_scan=full_scan)
+        mode = "w:{0}".format(compression) if compression else "w"
+        try:
+
+            with tarfile.open(path, mode) as archive:
+
+                errors = relocation.archive(
+                    archive, destination.lstrip(os.sep)
+                )
+
+            if errors:
+
+                raise RelocateError(errors)
+
+        except BaseException:
+
+            if os.path.exists(path):
+
+                os.unlink(path)
+
+            raise